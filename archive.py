@@ -19,14 +19,22 @@ Version 2.2 · 2025-06-26
   inaktif” koşuluyla çalışıyor.
 * Parametre `open=true` → sadece **açık** (Inbox/Team Inbox) konuşmalar
   taranıyor; kapalı arşiv taraması yok.
+
+Kapatma işlemi `--workers` kadar thread ile paralel yapılır (hepsi missive_client'ın
+ortak rate limiter'ından geçer). İlerleme her sayfadan sonra ARCHIVE_STATE_FILE'a
+yazılır; yarıda kalan bir çalıştırma tekrar başlatılınca kaldığı sayfadan devam eder
+ve kapattığı konuşmaları atlar (`--fresh` ile baştan başlar).
 """
 from __future__ import annotations
 import argparse
-import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 import logging
 from logging.handlers import RotatingFileHandler
-import requests
+
+import missive_client
+from checkpoint import read_json_state, write_json_state
+from user_directory import UserDirectory
 
 # ---------------------------------------------------------------------------
 # CONFIG – sabitler
@@ -37,29 +45,37 @@ TEAM_ID  = "e3aa36e4-d631-488d-8002-35f8e85bb824"   # boş → auto-discover
 ORG_ID   = "f50f2ccf-e588-4b56-bb15-672a515e0e1e"   # boş → auto-discover
 ARCHIVE_LABEL_ID = ""      # opsiyonel
 DEFAULT_DAYS_OLD = 30
-RATE_LIMIT_SLEEP = 1
+ARCHIVE_STATE_FILE = "missive_archive_state.json"   # yarıda kalan çalıştırmanın kaldığı yer
+CLOSE_WORKERS = missive_client.MAX_CONCURRENT_REQUESTS
 
 # ---------------------------------------------------------------------------
 # LOGGING
 # ---------------------------------------------------------------------------
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
 logger = logging.getLogger("missive_archive")
-logger.setLevel(logging.INFO)
-console = logging.StreamHandler()
-console.setFormatter(logging.Formatter(LOG_FORMAT))
-logger.addHandler(console)
-fh = RotatingFileHandler("missive_archive.log", maxBytes=1_000_000, backupCount=3)
-fh.setFormatter(logging.Formatter(LOG_FORMAT))
-logger.addHandler(fh)
 
-HEADERS = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
+
+def setup_logging() -> None:
+    """Console + dönen log dosyası; import sırasında değil, script çalışınca kurulur."""
+    if logger.handlers:
+        return
+    logger.setLevel(logging.INFO)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(console)
+    fh = RotatingFileHandler("missive_archive.log", maxBytes=1_000_000, backupCount=3)
+    fh.setFormatter(logging.Formatter(LOG_FORMAT))
+    logger.addHandler(fh)
+
+
+missive = missive_client.MissiveClient(API_KEY)
 
 # ---------------------------------------------------------------------------
 # HELPERS
 # ---------------------------------------------------------------------------
 
 def discover_team_and_org() -> tuple[str, str]:
-    r = requests.get("https://public.missiveapp.com/v1/teams", headers=HEADERS, timeout=30)
+    r = missive.get("/teams")
     r.raise_for_status()
     first = r.json()["teams"][0]
     logger.info("Auto‑discovered TEAM_ID=%s ORG_ID=%s", first["id"], first["organization"])
@@ -68,15 +84,12 @@ def discover_team_and_org() -> tuple[str, str]:
 
 def get_active_user_ids(org_id: str) -> set[str]:
     """Return IDs of organization users whose account is NOT deactivated."""
-    url = "https://public.missiveapp.com/v1/users"
-    r = requests.get(url, headers=HEADERS, params={"organization": org_id}, timeout=30)
-    if r.status_code == 404:
-        # fallback for older API path
-        url = f"https://public.missiveapp.com/v1/organizations/{org_id}/users"
-        r = requests.get(url, headers=HEADERS, timeout=30)
-    r.raise_for_status()
-    users = r.json().get("users", [])
-    active = {u["id"] for u in users if not u.get("is_deactivated", False)}
+    # Kapatma geri alınamaz: yeni eklenen/yeniden aktifleşen kullanıcıyı kaçırmamak için liste her
+    # çalıştırmada Missive'den çekilir, disk cache'i (main4'ün resolver'ı için) kullanılmaz
+    directory = UserDirectory(missive, cache_path=None, organization=org_id)
+    if not directory.refresh():
+        raise RuntimeError(f"Missive users for organization {org_id} could not be fetched")
+    active = directory.active_user_ids()
     logger.info("Fetched %d active users", len(active))
     return active
 
@@ -85,17 +98,22 @@ def get_active_user_ids(org_id: str) -> set[str]:
 # CORE
 # ---------------------------------------------------------------------------
 
-def list_unowned_convos(team_id: str, cutoff_ts: int, active_ids: set[str]):
-    """Yield IDs of open conversations older than cutoff that have *no active* assignee."""
-    url = "https://public.missiveapp.com/v1/conversations"
+def iter_unowned_pages(team_id: str, cutoff_ts: int, active_ids: set[str], until: int | None = None):
+    """
+    Yield (un-owned conversation IDs, cursor) per page of open conversations older than cutoff.
+    The cursor is the `until` value of the next page; pass it back to resume the scan there.
+    """
     params = {"team_all": team_id, "limit": 50, "open": True}
+    if until is not None:
+        params["until"] = until
     scanned = yielded = 0
     while True:
-        r = requests.get(url, headers=HEADERS, params=params, timeout=30)
+        r = missive.get("/conversations", params=params)
         r.raise_for_status()
         convos = r.json().get("conversations", [])
         if not convos:
             break
+        page = []
         for c in convos:
             scanned += 1
             if c.get("state") == "closed" or c.get("is_done") or c.get("closed"):
@@ -105,13 +123,20 @@ def list_unowned_convos(team_id: str, cutoff_ts: int, active_ids: set[str]):
             ids = [(a["id"] if isinstance(a, dict) else a) for a in c.get("assignees", [])]
             if not ids or not any(i in active_ids for i in ids):
                 yielded += 1
-                yield c["id"]
+                page.append(c["id"])
         params["until"] = convos[-1]["last_activity_at"]
+        yield page, params["until"]
         if len(convos) < params["limit"]:
             break
-        time.sleep(RATE_LIMIT_SLEEP)
     logger.info("Scanned %d convos, %d are un‑owned", scanned, yielded)
 
+
+def list_unowned_convos(team_id: str, cutoff_ts: int, active_ids: set[str]):
+    """Yield IDs of open conversations older than cutoff that have *no active* assignee."""
+    for page, _ in iter_unowned_pages(team_id, cutoff_ts, active_ids):
+        yield from page
+
+
 def close_conversation(cid: str, org_id: str, label_id: str | None) -> bool:
     post = {
         "conversation": cid,
@@ -129,12 +154,7 @@ def close_conversation(cid: str, org_id: str, label_id: str | None) -> bool:
         post["add_shared_labels"] = [label_id]
 
     payload = {"posts": post}        # ‘posts’ tekil nesne olmalı, liste değil
-    r = requests.post(
-        "https://public.missiveapp.com/v1/posts",
-        json=payload,
-        headers=HEADERS,
-        timeout=30
-    )
+    r = missive.post("/posts", json=payload)
     if r.ok:
         logger.info("Closed %s", cid)
         return True
@@ -142,6 +162,76 @@ def close_conversation(cid: str, org_id: str, label_id: str | None) -> bool:
     logger.error("Failed to close %s – %s", cid, r.text)
     return False
 
+
+class ArchiveProgress:
+    """Kapatılan konuşma ID'leri ve tarama cursor'ı; yarıda kalan çalıştırma buradan devam eder."""
+
+    def __init__(self, path: str, team_id: str):
+        self.path = path
+        self.team_id = team_id
+        self.until: int | None = None
+        self.closed: set[str] = set()
+
+    def load(self) -> bool:
+        """Aynı team için tamamlanmamış bir çalıştırma varsa onu yükler."""
+        data = read_json_state(self.path)
+        if not isinstance(data, dict) or data.get("completed") or data.get("team") != self.team_id:
+            return False
+        self.until = data.get("until")
+        self.closed = set(data.get("closed", []))
+        return True
+
+    def save(self, completed: bool = False) -> None:
+        data = {
+            "team": self.team_id,
+            "until": self.until,
+            "closed": [] if completed else sorted(self.closed),
+            "completed": completed,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            write_json_state(self.path, data)
+        except OSError as e:
+            logger.error("Archive progress %s could not be written: %s", self.path, e)
+
+
+def close_conversations(team_id: str, org_id: str, cutoff_ts: int, active_ids: set[str],
+                        label_id: str | None, progress: ArchiveProgress, workers: int = CLOSE_WORKERS) -> int:
+    """Un-owned konuşmaları sayfa sayfa, `workers` thread ile kapatır; her sayfadan sonra ilerlemeyi kaydeder."""
+    already_closed = len(progress.closed)
+    futures = {}
+
+    def collect(cid, future):
+        # progress.closed sadece bu (ana) thread'de değişir; save() ile yarışmaz
+        try:
+            if future.result():
+                progress.closed.add(cid)
+        except Exception:
+            logger.exception("Failed to close %s", cid)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="archive-close") as pool:
+        try:
+            for page, cursor in iter_unowned_pages(team_id, cutoff_ts, active_ids, until=progress.until):
+                pending = [cid for cid in page if cid not in progress.closed]
+                if len(pending) < len(page):
+                    logger.info("Skipping %d conversation(s) closed by an earlier run", len(page) - len(pending))
+                futures = {cid: pool.submit(close_conversation, cid, org_id, label_id) for cid in pending}
+                for cid, future in futures.items():
+                    collect(cid, future)
+                futures = {}
+                progress.until = cursor
+                progress.save()
+        except BaseException:
+            # Ctrl+C ya da hata: sıradakiler başlamasın, o ana kadar kapatılanlar kaydedilsin
+            pool.shutdown(wait=True, cancel_futures=True)
+            for cid, future in futures.items():
+                if not future.cancelled() and future.exception() is None and future.result():
+                    progress.closed.add(cid)
+            progress.save()
+            raise
+    progress.save(completed=True)
+    return len(progress.closed) - already_closed
+
 # ---------------------------------------------------------------------------
 # MAIN
 # ---------------------------------------------------------------------------
@@ -151,7 +241,11 @@ def main():
     p.add_argument("--days", type=int, default=DEFAULT_DAYS_OLD, help="Older than N days (default %(default)s)")
     p.add_argument("--team", help="Override team inbox ID")
     p.add_argument("--label", default=ARCHIVE_LABEL_ID, help="Shared‑label to apply (optional)")
+    p.add_argument("--workers", type=int, default=CLOSE_WORKERS, help="Parallel close requests (default %(default)s)")
+    p.add_argument("--state", default=ARCHIVE_STATE_FILE, help="Progress file for resuming (default %(default)s)")
+    p.add_argument("--fresh", action="store_true", help="Ignore the progress of an interrupted run")
     args = p.parse_args()
+    setup_logging()
 
     global TEAM_ID, ORG_ID
     if args.team:
@@ -162,11 +256,12 @@ def main():
     active_ids = get_active_user_ids(ORG_ID)
     cutoff_ts = int((datetime.now(timezone.utc) - timedelta(days=args.days)).timestamp())
 
-    archived = 0
-    for cid in list_unowned_convos(TEAM_ID, cutoff_ts, active_ids):
-        if close_conversation(cid, ORG_ID, args.label or None):
-            archived += 1
-        time.sleep(RATE_LIMIT_SLEEP)
+    progress = ArchiveProgress(args.state, TEAM_ID)
+    if not args.fresh and progress.load():
+        logger.info("Resuming interrupted run: %d conversation(s) already closed", len(progress.closed))
+
+    archived = close_conversations(TEAM_ID, ORG_ID, cutoff_ts, active_ids, args.label or None,
+                                   progress, workers=max(args.workers, 1))
 
     logger.info("Done – %d conversation(s) archived (>=%d days, team %s)", archived, args.days, TEAM_ID)
 
@@ -0,0 +1,115 @@
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+DONE = 'done'
+
+
+def assignee_key(user_ids):
+    return ','.join(sorted(set(user_ids)))
+
+
+class AssignmentLedger:
+    """
+    Hangi konuşmanın hangi kullanıcı grubuna atandığını SQLite'ta tutar; aynı (konuşma, assignee
+    seti) için hem aynı cycle içinde hem de yeniden başlatmalardan sonra ikinci bir post atılmaz.
+
+    Post atılmadan önce kayıt `pending` olarak yazılır (claim), başarılı olunca `done` olur
+    (confirm), hata olursa silinir (release). Post sırasında çökülürse kayıt pending kalır ve
+    `pending_timeout_seconds` dolana kadar tekrar denenmez. Süresi dolan pending kayıtta post
+    Missive'e ulaşıp confirm'den önce çökülmüş olabilir: `fetch_assignees(conversation_id)` ile
+    konuşmanın güncel assignee'lerine bakılır, atanmışsa kayıt `done` olur ve tekrar post atılmaz.
+    """
+
+    def __init__(self, path, fetch_assignees=None, pending_timeout_seconds=15 * 60, max_age_seconds=30 * 24 * 3600):
+        self.path = path
+        self.fetch_assignees = fetch_assignees
+        self.pending_timeout_seconds = pending_timeout_seconds
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS assignments (
+                conversation_id TEXT NOT NULL,
+                assignees TEXT NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (conversation_id, assignees)
+            )
+        """)
+        self.prune()
+
+    def claim(self, conversation_id, user_ids):
+        """
+        Post atılacaksa True, atama zaten yapıldıysa (ya da başka bir deneme sürüyorsa) False.
+        Yarım kalan bir denemenin sonucu doğrulanamıyorsa None; kayıt pending kalır.
+        """
+        key = assignee_key(user_ids)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, updated_at FROM assignments WHERE conversation_id = ? AND assignees = ?",
+                (conversation_id, key),
+            ).fetchone()
+            if row is None:
+                self._conn.execute(
+                    "INSERT INTO assignments (conversation_id, assignees, status, updated_at) VALUES (?, ?, ?, ?)",
+                    (conversation_id, key, PENDING, time.time()),
+                )
+                return True
+            status, updated_at = row
+            if status == DONE or time.time() - updated_at < self.pending_timeout_seconds:
+                return False
+
+        # Önceki deneme post'u atıp confirm'den önce çökmüş olabilir; tekrar atmadan önce Missive'e sor
+        assignees = self.fetch_assignees(conversation_id) if self.fetch_assignees else None
+        if assignees is None:
+            logger.warning(f"Assignment of conversation {conversation_id} left pending since {time.ctime(updated_at)} could not be verified")
+            return None
+        with self._lock:
+            if assignees:
+                self._conn.execute(
+                    "UPDATE assignments SET status = ?, updated_at = ? WHERE conversation_id = ? AND assignees = ?",
+                    (DONE, time.time(), conversation_id, key),
+                )
+                logger.info(f"Conversation {conversation_id} left pending since {time.ctime(updated_at)} is already assigned, marking it done")
+                return False
+            # Aynı pending kaydı arada başka bir thread almadıysa bu deneme sahiplenir
+            retried = self._conn.execute(
+                "UPDATE assignments SET updated_at = ? WHERE conversation_id = ? AND assignees = ? AND status = ? AND updated_at = ?",
+                (time.time(), conversation_id, key, PENDING, updated_at),
+            ).rowcount
+        if not retried:
+            return self.claim(conversation_id, user_ids)  # kayıt değişti, güncel haline göre karar ver
+        logger.warning(f"Retrying assignment of conversation {conversation_id} left pending since {time.ctime(updated_at)}")
+        return True
+
+    def confirm(self, conversation_id, user_ids):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE assignments SET status = ?, updated_at = ? WHERE conversation_id = ? AND assignees = ?",
+                (DONE, time.time(), conversation_id, assignee_key(user_ids)),
+            )
+
+    def release(self, conversation_id, user_ids):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM assignments WHERE conversation_id = ? AND assignees = ? AND status = ?",
+                (conversation_id, assignee_key(user_ids), PENDING),
+            )
+
+    def prune(self):
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM assignments WHERE updated_at < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+        if removed:
+            logger.info(f"Assignment ledger pruned {removed} old entries")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
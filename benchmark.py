@@ -0,0 +1,373 @@
+"""
+Assignment pipeline benchmark
+-----------------------------
+Sentetik verilerle (defensive_cases_with_a_numbers.csv formatında roster, EOIR formatında mail
+gövdeleri) pipeline aşamalarını ayrı ayrı ölçer. Gerçek Missive/MyCase verisine ve ağ erişimine
+ihtiyaç duymaz; atama istekleri sayılır ama gönderilmez.
+
+    python benchmark.py                                        # 1k/10k/100k satırlık roster
+    python benchmark.py --sizes 1000,10000 --json bench.json
+    python benchmark.py --json new.json --compare bench.json   # eşikten fazla yavaşlayan aşama varsa exit 1
+
+JSON çıktısında her ölçüm (stage, variant, size) ile anahtarlanır; --compare iki sürümün aynı
+anahtarlı ölçümlerini karşılaştırır.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+import roster
+import eoir_parser
+import main4
+from user_directory import UserResolver
+
+FIRST_NAMES = ['Mehmet', 'Memet', 'Muhammet', 'Mohammed', 'Ali', 'Ayşe', 'Fatma', 'İsmail', 'Oğuz',
+               'Şule', 'Çağrı', 'Gülşen', 'Hüseyin', 'Emine', 'Yusuf', 'Zeynep', 'Ömer', 'İbrahim']
+LAST_NAMES = ['Yılmaz', 'Kaya', 'Demir', 'Şahin', 'Çelik', 'Öztürk', 'Aydın', 'Özdemir', 'Arslan',
+              'Doğan', 'Kılıç', 'Aslan', 'Çetin', 'Koç', 'Kurt', 'Özkan', 'Şimşek', 'Güneş']
+ATTORNEYS = ['Arda Mert Geldi', 'Elifsu Coban', 'Ismail Dislik', '  Zeynep Aksoy ', '']
+CASE_SUFFIXES = ['', ' - Defensive Asylum', ' - BIA Appeal', '-Motion to Reopen', ' - Bond Request']
+FAMILY_SUFFIXES = ['', '', ' ve Ailesi', ' ve eşi', ' VE AILESI']
+COURTS = ['NEW YORK - BROADWAY', 'NEWARK', 'ELIZABETH', 'SAN FRANCISCO', 'HOUSTON - GESSNER']
+MISSIVE_USERS = ['Arda Mert Geldi', 'Elifsu Çoban', 'Ismail Dislik', 'Zeynep Aksoy', 'Gülşen Öztürk',
+                 'Ali Kaya', 'Şule Çelik', 'Ömer Faruk Demir', 'Hüseyin Koç', 'Fatma Arslan']
+# Roster'daki attorney yazımları Missive'dekinden farklı olabiliyor (Türkçe karaktersiz, küçük harf, boşluklu)
+PARALEGAL_SPELLINGS = ['Arda Mert Geldi', 'Elifsu Coban', 'Ismail Dislik', '  Zeynep Aksoy ', 'gulsen ozturk',
+                       'Sule Celik', 'Omer Faruk Demir', 'Huseyn Koc', 'Unknown Person']
+
+EOIR_NOTICE_HTML = """<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html><head><meta http-equiv="Content-Type" content="text/html; charset=utf-8">
+<style type="text/css">td {{ font-family: Arial; font-size: 11pt; }} .hdr {{ color: #1f3864; }}</style>
+<!--[if mso]><style>table {{border-collapse:collapse;}}</style><![endif]-->
+</head><body>
+<table width="100%" cellpadding="0" cellspacing="0" border="0">
+<tr><td class="hdr"><b>EOIR Courts &amp; Appeals System (ECAS)</b></td></tr>
+<tr><td>This is an automated notification. Please do not reply to this e&#8209;mail.</td></tr>
+<tr><td><b>Noncitizen Name:</b>&nbsp;{surname}, {first_name}</td></tr>
+<tr><td><b>A-Number:</b> {a_number}</td></tr>
+<tr><td><b>Document Type:</b> {document}</td></tr>
+<tr><td><b>Hearing Date:</b> {hearing_date}&nbsp;&nbsp;<b>Time:</b> {hearing_time}</td></tr>
+<tr><td><b>Court:</b> {court}</td></tr>
+<tr><td><b>Immigration Judge:</b> {judge}</td></tr>
+</table>
+<p style="font-size:9pt">&#169; Executive Office for Immigration Review &ndash; U.S. Department of Justice</p>
+</body></html>
+"""
+OTHER_EMAIL_HTML = """<div dir="ltr"><p>Merhaba,</p><p>{first_name} {surname} i&ccedil;in evraklar ekte.</p>
+<p>Te&#351;ekk&uuml;rler,<br>Elifsu</p><div class="gmail_quote">On Mon &lt;x@example.com&gt; wrote:</div></div>"""
+
+_ASCII_FOLD = str.maketrans(roster.TURKISH_CHAR_MAP)
+
+
+def write_synthetic_roster_csv(path, rows, seed=42):
+    rnd = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Case/Matter Name', 'Lead Attorney', 'Originating Attorney', 'A Number'])
+        for i in range(rows):
+            first = ' '.join(rnd.sample(FIRST_NAMES, rnd.choice([1, 1, 2])))
+            last = f"{rnd.choice(LAST_NAMES)}{i % 997 if rnd.random() < 0.7 else ''}"
+            case_name = f"{first} {last}{rnd.choice(FAMILY_SUFFIXES)}{rnd.choice(CASE_SUFFIXES)}"
+            a_number = rnd.choice(['', f"{rnd.randrange(10**9):09d}", f"{rnd.randrange(10**3):03d}-{rnd.randrange(10**3):03d}-{rnd.randrange(10**3):03d}"])
+            writer.writerow([case_name, rnd.choice(ATTORNEYS), rnd.choice(ATTORNEYS), a_number])
+
+
+def legacy_process_client_data(df):
+    """Eski satır satır (iterrows) roster yüklemesi, karşılaştırma için referans."""
+    clients = []
+    for _, row in df.iterrows():
+        case_name = row['Case/Matter Name']
+        lead_attorney = row['Lead Attorney']
+        originating_attorney = row['Originating Attorney']
+        a_number = roster.normalize_a_number(row.get('A Number'))
+        lead_attorney = lead_attorney.strip() if isinstance(lead_attorney, str) else ''
+        originating_attorney = originating_attorney.strip() if isinstance(originating_attorney, str) else ''
+
+        if pd.isnull(case_name) or (pd.isnull(lead_attorney) and pd.isnull(originating_attorney)):
+            continue
+
+        client_name_part = case_name.split('-')[0].strip() if '-' in case_name else case_name.strip()
+        client_name_cleaned = re.sub(r'\s+ve\s+(Ailesi|eşi)', '', client_name_part, flags=re.IGNORECASE)
+
+        name_parts = client_name_cleaned.split()
+        first_name = ' '.join(name_parts[:-1]) if len(name_parts) > 1 else name_parts[0]
+        last_name = name_parts[-1] if len(name_parts) > 1 else ''
+
+        clients.append(roster.Client(
+            first_name=first_name.upper(),
+            last_name=last_name.upper(),
+            lead_attorney=lead_attorney,
+            originating_attorney=originating_attorney,
+            a_number=a_number
+        ))
+    return roster.build_client_roster(clients)
+
+
+def vectorized_process_client_data(df):
+    frame = roster.prepare_client_frame(df)
+    return roster.build_client_roster(
+        roster.clients_from_frame(frame),
+        frame['full_name_key'].tolist(),
+        frame['surname_key'].tolist(),
+    )
+
+
+def _spelling_variant(rnd, name):
+    # Mailde isim roster'dakinden farklı yazılmış olabilir: MEHMET/MEMET gibi varyant ya da Türkçe karaktersiz
+    parts = [rnd.choice(roster.NAME_VARIANTS[part]) if part in roster.NAME_VARIANTS and rnd.random() < 0.5 else part
+             for part in name.split()]
+    name = ' '.join(parts)
+    return name.translate(_ASCII_FOLD) if rnd.random() < 0.3 else name
+
+
+def write_synthetic_message_bodies(count, seed=42, clients=None):
+    """
+    EOIR ECAS bildirimine benzeyen mail gövdeleri; bir kısmı EOIR dışı sıradan mail.
+    `clients` verilirse isimlerin çoğu roster'dan, varyant yazımlarla seçilir ki eşleştirme de ölçülsün.
+    """
+    rnd = random.Random(seed)
+    bodies = []
+    for i in range(count):
+        a_number = f"{rnd.randrange(10**3):03d}-{rnd.randrange(10**3):03d}-{rnd.randrange(10**3):03d}"
+        if clients and rnd.random() < 0.8:
+            client = rnd.choice(clients)
+            surname = _spelling_variant(rnd, client.last_name or client.first_name)
+            first_name = _spelling_variant(rnd, client.first_name)
+            if client.a_number and rnd.random() < 0.5:
+                a_number = f"{client.a_number[:3]}-{client.a_number[3:6]}-{client.a_number[6:]}"
+        else:
+            surname = rnd.choice(LAST_NAMES).upper()
+            first_name = ' '.join(rnd.sample(FIRST_NAMES, rnd.choice([1, 1, 2]))).upper()
+        fields = {
+            'surname': surname,
+            'first_name': first_name,
+            'a_number': a_number,
+            'document': rnd.choice(['Hearing Notice', 'Decision of the Immigration Judge', 'Filing Receipt']),
+            'hearing_date': f"{rnd.randint(1, 12):02d}/{rnd.randint(1, 28):02d}/2025",
+            'hearing_time': f"{rnd.randint(8, 15):02d}:{rnd.choice(['00', '30'])} {rnd.choice(['AM', 'PM'])}",
+            'court': rnd.choice(COURTS),
+            'judge': rnd.choice(['Smith, John', 'O&#39;Neil, Mary', 'Garc&iacute;a, Luis']),
+        }
+        template = EOIR_NOTICE_HTML if i % 5 else OTHER_EMAIL_HTML
+        bodies.append(template.format(**fields))
+    return bodies
+
+
+def soup_extract_notice_details(body):
+    """Eski BeautifulSoup yolu, karşılaştırma için referans."""
+    return eoir_parser.parse_notice_text(eoir_parser._soup_text(body))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _git_commit():
+    try:
+        completed = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+class BenchmarkResults:
+    """Ölçümleri toplar, ekrana yazar; `to_json` sürümler arası karşılaştırılabilir çıktı verir."""
+
+    def __init__(self):
+        self.results = []
+
+    def record(self, stage, variant, size, items, seconds, baseline_seconds=None):
+        self.results.append({
+            'stage': stage,
+            'variant': variant,
+            'size': size,
+            'items': items,
+            'seconds': round(seconds, 6),
+            'us_per_item': round(seconds / items * 1e6, 3) if items else None,
+        })
+        speedup = f"  ({baseline_seconds / seconds:.1f}x)" if baseline_seconds and seconds else ''
+        print(f"  {stage:<34} {variant:<14} size={size:<7} items={items:<7} {seconds:9.4f} s{speedup}")
+
+    def to_json(self):
+        return {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'git_commit': _git_commit(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+            },
+            'results': self.results,
+        }
+
+
+def _result_key(result):
+    return result['stage'], result['variant'], result['size']
+
+
+def compare_results(baseline, current, threshold):
+    """Aynı (stage, variant, size) ölçümlerini karşılaştırır; öğe başına süresi `threshold` katından fazla artanları döner."""
+    baseline_by_key = {_result_key(result): result for result in baseline.get('results', [])}
+    regressions = []
+    print(f"\nCompared with {baseline.get('meta', {}).get('git_commit') or 'baseline'} (threshold {threshold:.2f}x)")
+    for result in current['results']:
+        old = baseline_by_key.get(_result_key(result))
+        # Mesaj sayısı farklı çalıştırmalar da karşılaştırılabilsin diye öğe başına süre
+        if old is None or not old['us_per_item'] or result['us_per_item'] is None:
+            continue
+        ratio = result['us_per_item'] / old['us_per_item']
+        regressed = ratio > threshold
+        print(f"  {result['stage']:<34} {result['variant']:<14} size={result['size']:<7} "
+              f"{old['us_per_item']:11.2f} -> {result['us_per_item']:11.2f} us/item  ({ratio:.2f}x)"
+              f"{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append(result)
+    return regressions
+
+
+def bench_roster_loading(results, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'defensive_cases_with_a_numbers.csv')
+        write_synthetic_roster_csv(path, rows)
+        df = pd.read_csv(path, dtype={'A Number': str})
+
+    legacy, legacy_seconds = timed(legacy_process_client_data, df)
+    vectorized, vectorized_seconds = timed(vectorized_process_client_data, df)
+    if (legacy.clients != vectorized.clients or legacy.by_full_name != vectorized.by_full_name
+            or legacy.by_surname != vectorized.by_surname or legacy.by_a_number != vectorized.by_a_number):
+        raise AssertionError("Vectorized roster differs from the iterrows roster")
+
+    results.record('process_client_data', 'iterrows', rows, rows, legacy_seconds)
+    results.record('process_client_data', 'vectorized', rows, rows, vectorized_seconds, legacy_seconds)
+    return vectorized
+
+
+def bench_roster_snapshot(results, rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'defensive_cases_with_a_numbers.csv')
+        write_synthetic_roster_csv(path, rows)
+        from_csv, csv_seconds = timed(roster.load_roster, path)
+        from_snapshot, snapshot_seconds = timed(roster.load_roster, path)
+        if from_csv != from_snapshot:
+            raise AssertionError("Roster loaded from snapshot differs from the CSV roster")
+
+    results.record('load_roster', 'csv', rows, rows, csv_seconds)
+    results.record('load_roster', 'snapshot', rows, rows, snapshot_seconds, csv_seconds)
+
+
+def bench_extraction(results, bodies, size, compare_soup=True):
+    fast, fast_seconds = timed(lambda: [eoir_parser.extract_notice_details(body) for body in bodies])
+    soup_seconds = None
+    if compare_soup:
+        soup, soup_seconds = timed(lambda: [soup_extract_notice_details(body) for body in bodies])
+        if soup != fast:
+            raise AssertionError("Fast EOIR extraction differs from the BeautifulSoup extraction")
+        results.record('extract_client_details_from_body', 'beautifulsoup', size, len(bodies), soup_seconds)
+    results.record('extract_client_details_from_body', 'fast', size, len(bodies), fast_seconds, soup_seconds)
+    return [notice for notice in fast if notice.surname]
+
+
+def bench_matching(results, client_roster, notices, size):
+    main4.app.roster = client_roster
+    matches, seconds = timed(lambda: [main4.match_client_to_paralegal(notice) for notice in notices])
+    results.record('match_client_to_paralegal', 'indexed', size, len(notices), seconds)
+    return sum(match is not None for match in matches)
+
+
+def synthetic_messages(notices, seed=42):
+    """Aynı ailenin mailleri dakikalar arayla, aileler iş gününe yayılmış; her iki mail bir konuşma."""
+    rnd = random.Random(seed)
+    start = datetime(2025, 1, 6, 9, tzinfo=timezone.utc)
+    messages = []
+    for i, notice in enumerate(notices):
+        created_at = start + timedelta(minutes=rnd.randrange(8 * 60))
+        message = main4.Message(id=f"message-{i}", body='', created_at=created_at, conversation_id=f"conversation-{i // 2}")
+        message.notice = notice
+        messages.append(message)
+    return messages
+
+
+def bench_group_and_assign(results, client_roster, notices, size):
+    main4.app.roster = client_roster
+    messages = synthetic_messages(notices)
+    posts = []
+    assign_conversation = main4.assign_conversation
+    # Missive'e post atılmaz, sadece atamalar sayılır
+    main4.assign_conversation = lambda conversation_id, paralegal_names: posts.append(conversation_id) or True
+    try:
+        _, seconds = timed(main4.group_and_assign_messages, messages)
+    finally:
+        main4.assign_conversation = assign_conversation
+    results.record('group_and_assign_messages', 'no-network', size, len(messages), seconds)
+    return len(posts)
+
+
+def bench_user_resolution(results, lookups, seed=42):
+    rnd = random.Random(seed)
+    users = [{'id': str(i), 'name': name} for i, name in enumerate(MISSIVE_USERS)]
+    names = [rnd.choice(PARALEGAL_SPELLINGS) for _ in range(lookups)]
+
+    legacy, legacy_seconds = timed(lambda: [main4.find_closest_missive_user_name(name, users) for name in names])
+    resolver = UserResolver(users)
+    resolved, resolver_seconds = timed(lambda: [resolver.resolve(name) for name in names])
+    if legacy != resolved:
+        raise AssertionError("UserResolver differs from find_closest_missive_user_name")
+    results.record('find_closest_missive_user_name', 'difflib', lookups, lookups, legacy_seconds)
+    results.record('find_closest_missive_user_name', 'resolver', lookups, lookups, resolver_seconds, legacy_seconds)
+
+
+def run_suite(sizes, messages, compare_soup=True):
+    results = BenchmarkResults()
+    for rows in sizes:
+        print(f"Roster with {rows} rows, {messages} messages")
+        client_roster = bench_roster_loading(results, rows)
+        bench_roster_snapshot(results, rows)
+        bodies = write_synthetic_message_bodies(messages, clients=client_roster.clients)
+        notices = bench_extraction(results, bodies, rows, compare_soup=compare_soup)
+        matched = bench_matching(results, client_roster, notices, rows)
+        posts = bench_group_and_assign(results, client_roster, notices, rows)
+        print(f"  {matched}/{len(notices)} notices matched a paralegal, {posts} assignment posts\n")
+    print(f"Missive user resolution, {messages} lookups")
+    bench_user_resolution(results, messages)
+    return results
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmark the assignment pipeline on synthetic data")
+    p.add_argument("--sizes", default="1000,10000,100000", help="Comma separated roster sizes (default %(default)s)")
+    p.add_argument("--messages", type=int, default=2_000, help="Synthetic message bodies per roster size (default %(default)s)")
+    p.add_argument("--skip-soup", action="store_true", help="Do not time the BeautifulSoup reference extraction")
+    p.add_argument("--json", help="Write machine readable results to this file")
+    p.add_argument("--compare", help="Results JSON of an earlier run; exit 1 if a stage got slower than --threshold")
+    p.add_argument("--threshold", type=float, default=1.25, help="Allowed slowdown ratio for --compare (default %(default)s)")
+    args = p.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    data = run_suite(sizes, args.messages, compare_soup=not args.skip_soup).to_json()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        print(f"\nResults written to {args.json}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_results(baseline, data, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
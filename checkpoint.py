@@ -0,0 +1,118 @@
+import json
+import os
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+def read_json_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"State file {path} could not be read, starting fresh: {e}")
+        return None
+
+
+def write_json_state(path, data):
+    # Yarım yazılmış state dosyası kalmasın diye önce tmp'ye yaz, sonra rename et
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class PollingCheckpoint:
+    """
+    Polling döngüsünün kaldığı yeri tutar: en son taranan zaman (high-water) ve işlenmiş
+    konuşmaların last_activity değerleri. Her cycle sadece checkpoint'ten sonraki değişiklikleri
+    çeker; belli aralıklarla bütün pencere yeniden taranır (full sweep). Çekilemeyen ya da
+    atanamayan konuşmalar `failed`'da tutulur ve sonraki cycle'ın penceresi onları da kapsar.
+    """
+
+    def __init__(self, path, lookback=timedelta(days=3), overlap=timedelta(minutes=5),
+                 full_sweep_interval=timedelta(hours=6)):
+        self.path = path
+        self.lookback = lookback
+        # Saat farkları ve geç indekslenen konuşmalar için high-water'dan biraz geriden başla
+        self.overlap = overlap
+        self.full_sweep_interval = full_sweep_interval
+        self.high_water = None
+        self.last_full_sweep = None
+        self.handled = {}
+        self.failed = {}
+        self._failed_this_cycle = set()
+        self._load()
+
+    def _load(self):
+        data = read_json_state(self.path)
+        if not data:
+            return
+        try:
+            self.high_water = _parse_datetime(data.get('high_water'))
+            self.last_full_sweep = _parse_datetime(data.get('last_full_sweep'))
+            self.handled = {cid: _parse_datetime(ts) for cid, ts in data.get('handled', {}).items()}
+            self.failed = {cid: _parse_datetime(ts) for cid, ts in data.get('failed', {}).items()}
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Checkpoint {self.path} is invalid, starting with a full sweep: {e}")
+            self.high_water = self.last_full_sweep = None
+            self.handled = {}
+            self.failed = {}
+
+    def save(self):
+        data = {
+            'high_water': self.high_water.isoformat() if self.high_water else None,
+            'last_full_sweep': self.last_full_sweep.isoformat() if self.last_full_sweep else None,
+            'handled': {cid: ts.isoformat() for cid, ts in self.handled.items()},
+            'failed': {cid: ts.isoformat() for cid, ts in self.failed.items()},
+        }
+        try:
+            write_json_state(self.path, data)
+        except OSError as e:
+            logger.error(f"Checkpoint {self.path} could not be written: {e}")
+
+    def is_full_sweep_due(self, now):
+        return (self.high_water is None or self.last_full_sweep is None
+                or now - self.last_full_sweep >= self.full_sweep_interval)
+
+    def window_start(self, now, full_sweep):
+        if full_sweep:
+            return now - self.lookback
+        start = self.high_water - self.overlap
+        if self.failed:
+            # Önceki cycle'da yarım kalan konuşmalar full sweep'i beklemeden tekrar denensin
+            start = min(start, min(self.failed.values()))
+        return max(start, now - self.lookback)
+
+    def is_handled(self, conversation):
+        # Konuşmaya yeni mesaj geldiyse last_activity ilerler ve tekrar işlenir
+        handled_at = self.handled.get(conversation.id)
+        return handled_at is not None and conversation.last_activity <= handled_at
+
+    def mark_handled(self, conversation):
+        self.handled[conversation.id] = conversation.last_activity
+        self.failed.pop(conversation.id, None)
+
+    def mark_failed(self, conversation):
+        self.failed[conversation.id] = conversation.last_activity
+        self._failed_this_cycle.add(conversation.id)
+
+    def complete_cycle(self, now, full_sweep):
+        self.high_water = now
+        if full_sweep:
+            self.last_full_sweep = now
+        cutoff = now - self.lookback
+        self.handled = {cid: ts for cid, ts in self.handled.items() if ts >= cutoff}
+        # Pencere eski hataları da kapsadığı için bu cycle'da tekrar düşmeyenler ya işlendi ya da
+        # artık atanmamış listesinde değil (elle atanmış/kapatılmış)
+        self.failed = {cid: ts for cid, ts in self.failed.items()
+                       if cid in self._failed_this_cycle and ts >= cutoff}
+        self._failed_this_cycle = set()
+        self.save()
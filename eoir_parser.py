@@ -0,0 +1,195 @@
+"""
+EOIR bildirim maillerinden müvekkil bilgisini çıkaran parser.
+
+Eskiden her mail için BeautifulSoup ağacı kurulup `get_text(separator=' ')` üzerinde tek
+bir regex çalıştırılıyordu. Hızlı yol aynı metni ağaç kurmadan, HTML'i tek seferde tarayarak
+üretir: tag/yorum/script/style atılır, aradaki metin parçaları BeautifulSoup'un html.parser
+ile yaptığı gibi decode edilip ' ' ile birleştirilir. Hızlı yolun birebir taklit edemeyeceği
+bir yapı görülürse (CDATA, <pre>, tanınmayan entity, bozuk tag ...) BeautifulSoup'a düşülür.
+
+`extract_notice_details` bu metni bir kez tarayıp isim, A numarası ve duruşma alanlarını
+tek bir NoticeDetails kaydında döner; eşleştirme kodu gövdeyi tekrar taramaz.
+"""
+import re
+import logging
+import html.entities
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CLIENT_NAME_PATTERN = re.compile(r'Noncitizen Name:\s*([^,]+),\s*(.+)')
+A_NUMBER_PATTERN = re.compile(r'\b(\d{3}-\d{3}-\d{3}|\d{9})\b')
+# EOIR bildirimlerindeki "Etiket: değer" alanları; değer bir sonraki etikete ya da satır sonuna kadar
+_NOTICE_LABELS = re.compile(
+    r'(?P<label>Noncitizen Name|\b(?:A-Number|A Number|A#|Document Type|Hearing Date|Hearing Time|Time'
+    r'|Immigration Judge|Judge|Court Address|Court))\s*:'
+)
+_LABEL_FIELDS = {
+    'A-Number': 'a_number', 'A Number': 'a_number', 'A#': 'a_number',
+    'Document Type': 'document_type',
+    'Hearing Date': 'hearing_date',
+    'Hearing Time': 'hearing_time', 'Time': 'hearing_time',
+    'Immigration Judge': 'judge', 'Judge': 'judge',
+    'Court': 'court', 'Court Address': 'court_address',
+}
+
+# Metinden atılan işaretlemeler; script/style içeriği, yorumlar, doctype ve PI get_text'e girmez
+_MARKUP = re.compile(
+    r'<(script|style)\b[^<>]*>(.*?)</\1\s*>'
+    r'|<!--(.*?)-->'
+    r'|<!doctype[^<>]*>'
+    r'|<\?[^<>]*>'
+    r'|</?([a-z][^\t\n\r\f /<>\x00]*)[^<>]*>',
+    re.IGNORECASE | re.DOTALL,
+)
+# Bu tag'lerde BeautifulSoup boşlukları farklı işliyor ya da içerik farklı tipte string oluyor;
+# script/style buraya düşüyorsa düzgün kapanmamış demektir
+_UNSUPPORTED_TAGS = {'pre', 'textarea', 'template', 'script', 'style'}
+_ENTITY = re.compile(r'&(?:#([0-9]+)|#[xX]([0-9a-fA-F]+)|([a-zA-Z][a-zA-Z0-9]*));')
+# bs4'ün entity tablosu html.entities ile 'lang'/'rang' dışında aynı
+_NAMED_ENTITIES = {
+    name: chr(codepoint) for name, codepoint in html.entities.name2codepoint.items()
+    if name not in ('lang', 'rang')
+}
+_NAMED_ENTITIES['apos'] = "'"
+_ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _charref(number):
+    # bs4 256'dan küçük sayıları windows-1252 olarak yorumluyor (&#147; gibi)
+    if number < 256:
+        try:
+            return bytes([number]).decode('windows-1252')
+        except UnicodeDecodeError:
+            pass
+    try:
+        return chr(number)
+    except (ValueError, OverflowError):
+        return '\N{REPLACEMENT CHARACTER}'
+
+
+def _entity(match):
+    decimal, hexadecimal, name = match.groups()
+    if decimal is not None:
+        return _charref(int(decimal))
+    if hexadecimal is not None:
+        return _charref(int(hexadecimal, 16))
+    character = _NAMED_ENTITIES.get(name)
+    if character is None:
+        raise _Unsupported(name)
+    return character
+
+
+def _text_node(segment):
+    if '<' in segment or '>' in segment:
+        raise _Unsupported('stray angle bracket')
+    if '&' in segment:
+        decoded, count = _ENTITY.subn(_entity, segment)
+        if count != segment.count('&'):
+            raise _Unsupported('bare ampersand')
+        segment = decoded
+    if not segment.strip(_ASCII_SPACES):
+        # bs4 sadece boşluktan oluşan string'leri tek bir '\n' ya da ' ' yapıyor
+        return '\n' if '\n' in segment else ' '
+    return segment
+
+
+def _fast_text(body):
+    """BeautifulSoup(body, 'html.parser').get_text(separator=' ') ile aynı metin ya da taklit edilemiyorsa None."""
+    nodes = []
+    position = 0
+    try:
+        for match in _MARKUP.finditer(body):
+            if match.start() > position:
+                nodes.append(_text_node(body[position:match.start()]))
+            script, comment, tag = match.group(2), match.group(3), match.group(4)
+            if tag is not None and tag.lower() in _UNSUPPORTED_TAGS:
+                raise _Unsupported(tag)
+            if script is not None and '</' in script:
+                raise _Unsupported('ambiguous end of script')
+            if comment is not None and ('--' in comment or comment.startswith(('>', '->'))):
+                raise _Unsupported('ambiguous end of comment')
+            position = match.end()
+        if position < len(body):
+            nodes.append(_text_node(body[position:]))
+    except _Unsupported:
+        return None
+    return ' '.join(nodes)
+
+
+def _soup_text(body):
+    from bs4 import BeautifulSoup  # sadece hızlı yol kullanılamadığında gerekli
+    soup = BeautifulSoup(body, 'html.parser')
+    return soup.get_text(separator=' ')
+
+
+@dataclass
+class NoticeDetails:
+    surname: Optional[str] = None
+    first_name: Optional[str] = None
+    a_number: Optional[str] = None
+    document_type: Optional[str] = None
+    hearing_date: Optional[str] = None
+    hearing_time: Optional[str] = None
+    court: Optional[str] = None
+    court_address: Optional[str] = None
+    judge: Optional[str] = None
+
+    @property
+    def full_name(self):
+        return f"{self.first_name or ''} {self.surname or ''}".strip()
+
+
+def _field_value(text, start, end):
+    value = text[start:end].split('\n', 1)[0]
+    return ' '.join(value.split()) or None
+
+
+def parse_notice_text(text):
+    details = NoticeDetails()
+    labels = list(_NOTICE_LABELS.finditer(text))
+    for i, label in enumerate(labels):
+        name = label.group('label')
+        if name == 'Noncitizen Name':
+            # Eski regex.search ile aynı: ilk uyan "Noncitizen Name:" kazanır
+            if details.surname is None:
+                client_name_match = CLIENT_NAME_PATTERN.match(text, label.start())
+                if client_name_match:
+                    details.surname = client_name_match.group(1).strip()
+                    details.first_name = client_name_match.group(2).strip()
+            continue
+        field = _LABEL_FIELDS[name]
+        if getattr(details, field) is not None:
+            continue
+        end = labels[i + 1].start() if i + 1 < len(labels) else len(text)
+        value = _field_value(text, label.end(), end)
+        if field == 'a_number':
+            a_number_match = A_NUMBER_PATTERN.search(value or '')
+            value = a_number_match.group(0) if a_number_match else None
+        setattr(details, field, value)
+
+    if details.a_number is None:
+        # Etiketsiz A numarası (iletilen mailler vb.); markup'taki takip ID'lerine takılmamak için sadece metinde ara
+        a_number_match = A_NUMBER_PATTERN.search(text)
+        details.a_number = a_number_match.group(0) if a_number_match else None
+    return details
+
+
+def extract_notice_details(body):
+    text = _fast_text(body)
+    if text is None:
+        text = _soup_text(body)
+    return parse_notice_text(text)
+
+
+def extract_client_details_from_body(body):
+    details = extract_notice_details(body)
+    return {
+        'first_name': details.first_name,
+        'surname': details.surname,
+    }
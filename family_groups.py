@@ -0,0 +1,182 @@
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from checkpoint import read_json_state, write_json_state
+from roster import normalize_name
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING_CONVERSATIONS = 50  # eşleşmemiş bir ailenin state'te tutulan konuşma sayısı
+
+
+@dataclass
+class FamilyGroup:
+    surname: str
+    start: datetime
+    end: datetime
+    # (created_at, sıra, message); aynı zamanlı maillerde geliş sırası korunur
+    entries: List[tuple] = field(default_factory=list)
+
+    @property
+    def messages(self):
+        return [message for _, _, message in self.entries]
+
+    @property
+    def conversation_ids(self):
+        return list(dict.fromkeys(message.conversation_id for message in self.messages))
+
+
+@dataclass
+class FamilyRecord:
+    """Bir soyadın en son kapanan grubu: zaman aralığı, atandığı paralegal ya da atanamadıysa konuşmaları."""
+    start: datetime
+    end: datetime
+    paralegal: Optional[str] = None
+    conversations: List[str] = field(default_factory=list)
+
+
+class FamilyState:
+    """
+    Soyad başına en son aile grubunu cycle'lar arasında saklar. İki poll'a bölünen bir ailenin
+    sonraki maili, önceki maillerin gövdeleri tekrar çekilmeden o grubun paralegal'ine atanabilir;
+    önceki grup eşleşmemişse konuşmaları saklanır ve sonradan eşleşen kardeşle birlikte, hâlâ
+    atanmamışlarsa, atanır.
+    """
+
+    def __init__(self, path, window, retention=timedelta(days=3)):
+        self.path = path
+        self.window = window
+        self.retention = retention
+        self.records = {}
+        self._load()
+
+    def _load(self):
+        data = read_json_state(self.path) if self.path else None
+        if not isinstance(data, dict):
+            return
+        try:
+            self.records = {
+                surname: FamilyRecord(
+                    start=datetime.fromisoformat(record['start']),
+                    end=datetime.fromisoformat(record['end']),
+                    paralegal=record.get('paralegal'),
+                    conversations=list(record.get('conversations', [])),
+                )
+                for surname, record in data.items()
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Family state {self.path} is invalid, starting fresh: {e}")
+            self.records = {}
+
+    def save(self, now=None):
+        cutoff = (now or datetime.now(timezone.utc)) - self.retention
+        self.records = {surname: record for surname, record in self.records.items() if record.end >= cutoff}
+        data = {
+            surname: {
+                'start': record.start.isoformat(),
+                'end': record.end.isoformat(),
+                'paralegal': record.paralegal,
+                'conversations': record.conversations,
+            }
+            for surname, record in self.records.items()
+        }
+        try:
+            write_json_state(self.path, data)
+        except OSError as e:
+            logger.error(f"Family state {self.path} could not be written: {e}")
+
+    def previous(self, group):
+        """Grup, aynı soyadın kaydedilmiş grubuyla zaman penceresi içinde birleşiyorsa o kayıt."""
+        record = self.records.get(group.surname)
+        if record is None:
+            return None
+        if group.start - self.window <= record.end and record.start <= group.end + self.window:
+            return record
+        return None
+
+    def record(self, group, paralegal, previous=None):
+        if previous is not None:
+            start, end = min(previous.start, group.start), max(previous.end, group.end)
+        else:
+            current = self.records.get(group.surname)
+            if current is not None and current.end > group.end:
+                return  # full sweep'te eski bir grup; daha yeni kaydı ezme
+            start, end = group.start, group.end
+        if paralegal:
+            conversations = []
+        else:
+            earlier = previous.conversations if previous is not None else []
+            conversations = list(dict.fromkeys(earlier + group.conversation_ids))[-MAX_PENDING_CONVERSATIONS:]
+        self.records[group.surname] = FamilyRecord(start, end, paralegal, conversations)
+
+
+class FamilyGroupBuffer:
+    """
+    Aynı soyadlı mailleri zaman penceresine göre gruplar: aralarındaki fark `window`'dan küçük
+    olan ardışık mailler aynı gruptadır (group_and_assign_messages ile aynı kural). Mailler akış
+    halinde eklenir; iki grubun arasına düşen bir mail ikisini birleştirir.
+
+    Bir gruba artık hiçbir mail katılamayacağı anda grup `on_group(group, previous)` ile bırakılır.
+    Polling konuşmaları yeniden eskiye taradığı için watermark işlenen son konuşmanın last_activity'sidir:
+    sonra gelecek her mail ondan eski, yani en eski maili watermark'tan `window`'dan fazla yeni olan
+    grup kapanmıştır. Sırasız kaynaklarda (webhook) gruplar `flush` ile bırakılır.
+
+    `state` verilirse `previous` önceki cycle'lardan aynı aileye ait kayıttır (yoksa None);
+    `on_group`'un döndüğü paralegal state'e yazılır.
+    """
+
+    def __init__(self, window, on_group, state=None):
+        self.window = window
+        self.on_group = on_group
+        self.state = state
+        self._groups = {}  # normalize soyad -> açık gruplar
+        self._sequence = 0
+
+    def __len__(self):
+        return sum(len(group.entries) for groups in self._groups.values() for group in groups)
+
+    def add(self, message):
+        surname = normalize_name(message.notice.surname)
+        created_at = message.created_at
+        self._sequence += 1
+        merged = FamilyGroup(surname, created_at, created_at, [(created_at, self._sequence, message)])
+
+        groups = self._groups.setdefault(surname, [])
+        remaining = []
+        for group in groups:
+            if group.start - self.window <= created_at <= group.end + self.window:
+                merged.start = min(merged.start, group.start)
+                merged.end = max(merged.end, group.end)
+                merged.entries.extend(group.entries)
+            else:
+                remaining.append(group)
+        merged.entries.sort(key=lambda entry: entry[:2])
+        remaining.append(merged)
+        self._groups[surname] = remaining
+
+    def advance(self, watermark):
+        """Bundan sonra gelecek mailler `watermark`'tan yeni olmayacaksa kapanan grupları bırakır."""
+        for surname in list(self._groups):
+            closed = [group for group in self._groups[surname] if group.start - watermark > self.window]
+            if not closed:
+                continue
+            open_groups = [group for group in self._groups[surname] if group.start - watermark <= self.window]
+            if open_groups:
+                self._groups[surname] = open_groups
+            else:
+                del self._groups[surname]
+            self._release(closed)
+
+    def flush(self):
+        groups, self._groups = self._groups, {}
+        for surname_groups in groups.values():
+            self._release(surname_groups)
+
+    def _release(self, groups):
+        for group in sorted(groups, key=lambda group: group.start):
+            previous = self.state.previous(group) if self.state is not None else None
+            paralegal = self.on_group(group, previous)
+            if self.state is not None:
+                self.state.record(group, paralegal, previous)
@@ -1,18 +1,16 @@
 import test
 import requests
 import re
-import pandas as pd
 import time
 from datetime import datetime, timedelta, timezone
-from bs4 import BeautifulSoup
 from dateutil import parser
 from dataclasses import dataclass
 from typing import List
+from functools import lru_cache
 import logging
 import math  
 import os
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 EOIR_TEAM_ID = 'e3aa36e4-d631-488d-8002-35f8e85bb824'
@@ -40,6 +38,7 @@ class Conversation:
 
 
 def load_client_data(csv_file_path):
+    import pandas as pd  # ağır import, sadece client listesi yüklenirken
     df = pd.read_csv(csv_file_path)
     clients = process_client_data(df)
     return clients
@@ -47,6 +46,7 @@ def load_client_data(csv_file_path):
 
 # Fetch data from csv file, burayı optimize etmek lazım, database : case_name - lead_attorney,originating_attorney
 def process_client_data(df):
+    import pandas as pd
     clients = []
     for _, row in df.iterrows():
         case_name = row['Case/Matter Name']
@@ -85,22 +85,21 @@ def process_client_data(df):
 
 
 
-clients = load_client_data(CSV_FILE_PATH)
+# Client listesi ve Missive istemcisi ilk kullanımda yüklenir, import sırasında değil
+@lru_cache(maxsize=None)
+def get_clients():
+    return load_client_data(CSV_FILE_PATH)
 
 # API interaction
 def fetch_unassigned_conversations(team_id, start_date=None, end_date=None):
     conversations = []
-    url = 'https://public.missiveapp.com/v1/conversations'
-    headers = {
-        'Authorization': f'Bearer {test.MISSIVE_API_KEY}'
-    }
     params = {
         'team_all': team_id,
         'limit': 50,
     }
 
     while True:
-        response = requests.get(url, headers=headers, params=params)
+        response = test.get_missive_client().get('/conversations', params=params)
         if response.status_code != 200:
             logger.error(f'Failed to retrieve conversations: {response.text}')
             break
@@ -136,14 +135,10 @@ def fetch_unassigned_conversations(team_id, start_date=None, end_date=None):
 
 
 def fetch_conversation_messages(conversation_id):
-    url = f'https://public.missiveapp.com/v1/conversations/{conversation_id}/messages'
-    headers = {
-        'Authorization': f'Bearer {test.MISSIVE_API_KEY}'
-    }
     params = {
         'limit': 10
     }
-    response = requests.get(url, headers=headers, params=params)
+    response = test.get_missive_client().get(f'/conversations/{conversation_id}/messages', params=params)
     if response.status_code == 200:
         messages_data = response.json().get('messages', [])
         if not messages_data:
@@ -165,11 +160,7 @@ def fetch_conversation_messages(conversation_id):
         return []
 
 def get_full_message(message_id):
-    url = f'https://public.missiveapp.com/v1/messages/{message_id}'
-    headers = {
-        'Authorization': f'Bearer {test.MISSIVE_API_KEY}'
-    }
-    response = requests.get(url, headers=headers)
+    response = test.get_missive_client().get(f'/messages/{message_id}')
     if response.status_code == 200:
         response_json = response.json()
         msg = response_json.get('messages', {})
@@ -234,6 +225,7 @@ def parse_created_at(timestamp):
 
 
 def extract_client_details_from_body(body):
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(body, 'html.parser')
     text = soup.get_text(separator=' ')
     
@@ -267,6 +259,8 @@ def match_client_to_paralegal(client_details):
     #logger.info(full_name)
     matched_clients = []
 
+    clients = get_clients()
+
     # Tam isim ve soyisim eşleşmesi
     for client in clients:
         client_full_name = f"{client.first_name} {client.last_name}".strip().upper()
@@ -315,11 +309,6 @@ def assign_conversation_to_paralegal(conversation_id, paralegal_name):
 
     user_id = paralegal_user['id']
 
-    url = 'https://public.missiveapp.com/v1/posts'
-    headers = {
-        'Authorization': f'Bearer {test.MISSIVE_API_KEY}',
-        'Content-Type': 'application/json'
-    }
     data = {
         "posts": {
             "conversation": conversation_id,
@@ -334,7 +323,7 @@ def assign_conversation_to_paralegal(conversation_id, paralegal_name):
     }
 
     try:
-        response = requests.post(url, json=data, headers=headers)
+        response = test.get_missive_client().post('/posts', json=data)
         response.raise_for_status()
         
         logger.info(f"Conversation {conversation_id} assigned to {paralegal_name}.")
@@ -487,6 +476,7 @@ def process_message(message, assigned_paralegals):
         logger.info(f"No paralegal found for '{full_name}'. Please review manually.")
 # Main Loop
 def main():
+    logging.basicConfig(level=logging.INFO)
     while True:
         try:
             run_assignment_process()
@@ -1,33 +1,56 @@
 import test
+import asyncio
 import requests
-import re
-import pandas as pd
 import time
 from datetime import datetime, timedelta, timezone
-from bs4 import BeautifulSoup
 from dateutil import parser
 from dataclasses import dataclass
+import threading
+import queue
+from itertools import islice
 from typing import List
+import argparse
 import logging
 import math  
 import os
 import difflib
-import unicodedata
-logging.basicConfig(level=logging.INFO)
+from roster import RosterReloader, load_roster, normalize_name
+from checkpoint import PollingCheckpoint
+from message_cache import MessageCache
+from assignment_ledger import AssignmentLedger
+from eoir_parser import extract_notice_details
+from webhook import WebhookReceiver
+from family_groups import FamilyGroupBuffer, FamilyState
+import metrics
 logger = logging.getLogger(__name__)
 
 EOIR_TEAM_ID = 'e3aa36e4-d631-488d-8002-35f8e85bb824'
 CSV_FILE_PATH = "cases.csv"  # Orijinal CSV dosyasının yolu
 FILTERED_CSV_FILE = "defensive_cases_with_a_numbers.csv"  # Filtrelenmiş CSV'nin yolu
+CHECKPOINT_FILE = "assignment_checkpoint.json"  # Polling'in kaldığı yer, işlenen konuşmalar
+FULL_SWEEP_INTERVAL = timedelta(hours=6)  # Kaçırılan konuşmalar için 3 günlük pencere bu aralıkla tamamen taranır
+MESSAGE_CACHE_FILE = "message_cache.sqlite3"  # message ID -> (body, created_at), mesajlar değişmediği için bir kere çekilir
+MESSAGE_CACHE_MAX_ENTRIES = 50000
+ASSIGNMENT_LEDGER_FILE = "assignment_ledger.sqlite3"  # (konuşma, assignee seti) -> atandı mı, aynı post iki kere atılmasın
+FAMILY_STATE_FILE = "family_groups.json"  # soyad -> son aile grubu ve paralegal'i, iki poll'a bölünen aileler için
+MAX_CONCURRENT_REQUESTS = 5  # Mesaj listesi/gövdesi çekerken aynı anda en fazla bu kadar istek
+STREAM_BATCH_SIZE = 25  # Mesajları birlikte çekilip parse edilen konuşma sayısı; atamalar her parçadan sonra başlar
+STREAM_BUFFER_SIZE = 100  # Sayfalama mesaj çekmenin en fazla bu kadar konuşma önünde gider
+POLL_INTERVAL_SECONDS = 150
+WEBHOOK_SAFETY_POLL_SECONDS = 30 * 60  # Webhook modunda kaçan olaylar için polling sadece bu aralıkla
+METRICS_FILE = "assignment_metrics.prom"  # --once modunda metrikler buraya yazılır
+METRICS_PORT = 9108
+
+# Bu paralegal'e atanan konuşmalar ekibindekilere de atanır
+ASSIGNEE_TEAMS = {
+    "Ismail Dislik": ["Arda Mert Geldi", "Elifsu Coban"],
+}
+
+CONVERSATIONS = metrics.counter('assignment_conversations_total', 'Conversations taken into an assignment cycle', ['source'])
+NOTICES = metrics.counter('assignment_messages_parsed_total', 'Message bodies parsed, by whether an EOIR notice was found', ['result'])
+ASSIGNMENTS = metrics.counter('assignment_posts_total', 'Assignment attempts by outcome', ['result'])
 
 TIME_WINDOW_MINUTES = 30  # aile üye mailleri için offset time, aynı soyisimde unassigned-assigned mailler varsa aynı paralegale assign et.
-@dataclass
-class Client:
-    first_name: str
-    last_name: str
-    lead_attorney: str
-    originating_attorney: str
-
 @dataclass
 class Message:
     id: str
@@ -43,71 +66,85 @@ class Conversation:
 
 
 
-def load_client_data(FILTERED_CSV_FILE):
-    df = pd.read_csv(FILTERED_CSV_FILE)
-    clients = process_client_data(df)
-    return clients
+def _resource(factory):
+    """İlk erişimde bir kere oluşturulan kaynak; mesajlar thread'lerde çekildiği için oluşturma kilitli."""
+    name = factory.__name__
 
+    def get(self):
+        try:
+            return self._resources[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = factory(self)
+            return self._resources[name]
 
-# Fetch data from csv file, burayı optimize etmek lazım, database : case_name - lead_attorney,originating_attorney
-def process_client_data(df):
-    clients = []
-    for _, row in df.iterrows():
-        case_name = row['Case/Matter Name']
-        lead_attorney = row['Lead Attorney']
-        originating_attorney = row['Originating Attorney'] 
-        lead_attorney = lead_attorney.strip() if isinstance(lead_attorney, str) else ''
-        originating_attorney = originating_attorney.strip() if isinstance(originating_attorney, str) else ''
+    def set(self, value):
+        with self._lock:
+            self._resources[name] = value
 
-        if pd.isnull(case_name) or (pd.isnull(lead_attorney) and pd.isnull(originating_attorney)):
-            continue
-        #if pd.isnull(lead_attorney):
-         #   lead_attorney = ''
-        #else:
-         #   lead_attorney = str(lead_attorney).strip()
-
-        #if pd.isnull(originating_attorney):
-          #  originating_attorney = ''
-        #else:
-         #   originating_attorney = str(originating_attorney).strip()
-
-        # Extract client name from case_name
-        #case_name = re.sub(r'^\[.*?\]\s*', '', case_name).strip()
-        client_name_part = case_name.split('-')[0].strip() if '-' in case_name else case_name.strip()
-        client_name_cleaned = re.sub(r'\s+ve\s+(Ailesi|eşi)', '', client_name_part, flags=re.IGNORECASE)
-        
-        # Split the name into parts
-        name_parts = client_name_cleaned.split()
-        first_name = ' '.join(name_parts[:-1]) if len(name_parts) > 1 else name_parts[0]
-        last_name = name_parts[-1] if len(name_parts) > 1 else ''
-
-        clients.append(Client(
-            first_name=first_name.upper(),
-            last_name=last_name.upper(),
-            lead_attorney=lead_attorney,
-            originating_attorney=originating_attorney 
-        ))
-    return clients
+    return property(get, set)
+
+
+class AppContext:
+    """
+    main4'ün kullandığı kaynaklar. Hepsi ilk kullanımda oluşturulur; modülü import etmek
+    credentials okumaz, ağ isteği atmaz ve CSV yüklemez (benchmark ve tek seferlik çalıştırmalar için).
+    """
+
+    def __init__(self):
+        self._resources = {}
+        self._lock = threading.RLock()
+
+    @_resource
+    def missive(self):
+        return test.get_missive_client()
+
+    @_resource
+    def user_directory(self):
+        return test.get_user_directory()
+
+    @_resource
+    def roster_reloader(self):
+        return RosterReloader(FILTERED_CSV_FILE)
+
+    @_resource
+    def roster(self):
+        # CSV değişiklik takibi yüklenen roster'la aynı anda başlasın
+        self.roster_reloader
+        return load_roster(FILTERED_CSV_FILE)
+
+    @_resource
+    def message_cache(self):
+        return MessageCache(MESSAGE_CACHE_FILE, max_entries=MESSAGE_CACHE_MAX_ENTRIES)
+
+    @_resource
+    def assignment_ledger(self):
+        return AssignmentLedger(ASSIGNMENT_LEDGER_FILE, fetch_assignees=conversation_assignees)
+
+    @_resource
+    def family_state(self):
+        return FamilyState(FAMILY_STATE_FILE, timedelta(minutes=TIME_WINDOW_MINUTES))
 
+    @_resource
+    def checkpoint(self):
+        return PollingCheckpoint(CHECKPOINT_FILE, lookback=timedelta(days=3), full_sweep_interval=FULL_SWEEP_INTERVAL)
 
 
-clients = load_client_data(FILTERED_CSV_FILE)
+app = AppContext()
 
 # API interaction
-def fetch_unassigned_conversations(team_id, start_date=None, end_date=None):
-    conversations = []
-    url = 'https://public.missiveapp.com/v1/conversations'
-    headers = {
-        'Authorization': f'Bearer {test.MISSIVE_API_KEY}'
-    }
+def iter_unassigned_conversations(team_id, start_date=None, end_date=None):
+    """Atanmamış konuşmaları sayfa sayfa, yeniden eskiye (last_activity'ye göre) verir."""
     params = {
         'team_all': team_id,
         'limit': 50,
     }
     count = 0
     while True:
-        response = requests.get(url, headers=headers, params=params)
-        time.sleep(1)  # Rate limit'e takılmamak için bekleme
+        with metrics.stage('fetch_conversations'):
+            response = app.missive.get('/conversations', params=params)
         if response.status_code != 200:
             logger.error(f'Failed to retrieve conversations: {response.text}')
             break
@@ -129,7 +166,8 @@ def fetch_unassigned_conversations(team_id, start_date=None, end_date=None):
 
             # Zaman filtrelemesi
             if start_date and last_activity < start_date:
-                return conversations  # Daha eski konuşmalara gerek yok
+                logger.info(f"Total conversations retrieved: {count}")
+                return  # Daha eski konuşmalara gerek yok
             if end_date and last_activity > end_date:
                 continue  # Daha yeni konuşmaları atla
 
@@ -140,8 +178,8 @@ def fetch_unassigned_conversations(team_id, start_date=None, end_date=None):
                     last_activity=last_activity,
                     messages=[]
                 )
-                conversations.append(conversation_obj)
                 count += 1
+                yield conversation_obj
 
         # Pagination
         oldest_last_activity = convos[-1].get('last_activity_at')
@@ -151,16 +189,54 @@ def fetch_unassigned_conversations(team_id, start_date=None, end_date=None):
             break
 
     logger.info(f"Total conversations retrieved: {count}")
-    return conversations
+
+
+def fetch_unassigned_conversations(team_id, start_date=None, end_date=None):
+    return list(iter_unassigned_conversations(team_id, start_date=start_date, end_date=end_date))
+
+
+def prefetch(iterable, buffer_size):
+    """
+    `iterable`'ı arka plan thread'inde tüketir, en fazla `buffer_size` eleman önden hazırlanır
+    (sayfalama mesaj çekmeyle paralel ilerler ama ondan fazla açılmaz). Üreticideki hata tüketicide tekrar fırlatılır.
+    """
+    buffer = queue.Queue(buffer_size)
+    stopped = threading.Event()
+
+    def put(entry):
+        while not stopped.is_set():
+            try:
+                buffer.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((True, item)):
+                    return
+        except Exception as e:
+            put((False, e))
+            return
+        put((False, None))
+
+    threading.Thread(target=produce, name='conversation-pager', daemon=True).start()
+    try:
+        while True:
+            has_item, item = buffer.get()
+            if not has_item:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stopped.set()
 
 def delete_conversation(conversation_id):
-    url = f'https://public.missiveapp.com/v1/conversations/{conversation_id}'
-    headers = {
-        'Authorization': f'Bearer {test.MISSIVE_API_KEY}',
-        'Content-Type': 'application/json'
-    }
     try:
-        response = requests.delete(url, headers=headers)
+        response = app.missive.delete(f'/conversations/{conversation_id}')
         response.raise_for_status()
         logger.info(f"Conversation {conversation_id} deleted successfully.")
         return True
@@ -169,23 +245,37 @@ def delete_conversation(conversation_id):
         return False
 
 
+def conversation_assignees(conversation_id):
+    """Konuşmanın Missive'deki güncel assignee listesi; cevap alınamazsa None."""
+    try:
+        response = app.missive.get(f'/conversations/{conversation_id}')
+        response.raise_for_status()
+        conversations = response.json().get('conversations', [])
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.error(f"Could not check assignees of conversation {conversation_id}: {e}")
+        return None
+    if not conversations:
+        logger.error(f"Conversation {conversation_id} not found while checking its assignees")
+        return None
+    return conversations[0].get('assignees') or []
+
+
+def conversation_is_unassigned(conversation_id):
+    """Konuşmanın şu an kimseye atanmamış olduğunu doğrular; cevap alınamazsa False (atanmış say)."""
+    return conversation_assignees(conversation_id) == []
+
+
 def fetch_conversation_messages(conversation_id):
-    url = f'https://public.missiveapp.com/v1/conversations/{conversation_id}/messages'
-    headers = {'Authorization': f'Bearer {test.MISSIVE_API_KEY}'}
     params = {'limit': 10}
     
     try:
-        response = requests.get(url, headers=headers, params=params)
+        # 429 durumunda bekleyip tekrar deneme missive_client içinde yapılıyor
+        response = app.missive.get(f'/conversations/{conversation_id}/messages', params=params)
         
         if response.status_code == 200:
             messages_data = response.json().get('messages', [])
             # Process messages as before
             return process_messages(messages_data, conversation_id)
-        elif response.status_code == 429:  # Too Many Requests
-            retry_after = int(response.headers.get('Retry-After', 1))
-            logger.warning(f'Rate limit hit. Retrying after {retry_after} seconds...')
-            time.sleep(retry_after) 
-            return fetch_conversation_messages(conversation_id)
         else:
             logger.error(f'Error: {response.text}')
             return []
@@ -193,16 +283,28 @@ def fetch_conversation_messages(conversation_id):
         logger.error(f'Unexpected error: {e}')
         return []
 def process_messages(messages_data, conversation_id):
+    # Liste cevabında body ve created_at varsa sakla, get_full_message sadece eksik alanlar için çağrılır
     messages = []
     for msg in messages_data:
         message_id = msg.get('id')
+        body = msg.get('body') or ''
+        created_at_raw = msg.get('createdAt', msg.get('created_at'))
+        created_at = parse_created_at(created_at_raw) if created_at_raw is not None else None
+        if body and created_at:
+            app.message_cache.put(message_id, body, created_at_raw)
         messages.append(Message(
             id=message_id,
-            body='',  
-            created_at=None,  
+            body=body,
+            created_at=created_at,
             conversation_id=conversation_id
         ))
     return messages
+
+def get_message_content(message):
+    """Mesajın (body, created_at) bilgisi; liste cevabından geldiyse tekrar istek atılmaz."""
+    if message.body and message.created_at:
+        return message.body, message.created_at
+    return get_full_message(message.id)
 def normalize_turkish_chars(s):
     if not isinstance(s, str):
         s = str(s)
@@ -240,11 +342,10 @@ def find_closest_missive_user_name(name, users, cutoff_ratio=0.8):
                 return user
     return None
 def get_full_message(message_id):
-    url = f'https://public.missiveapp.com/v1/messages/{message_id}'
-    headers = {
-        'Authorization': f'Bearer {test.MISSIVE_API_KEY}'
-    }
-    response = requests.get(url, headers=headers)
+    cached = app.message_cache.get(message_id)
+    if cached:
+        return cached
+    response = app.missive.get(f'/messages/{message_id}')
     if response.status_code == 200:
         response_json = response.json()
         msg = response_json.get('messages', {})
@@ -258,42 +359,54 @@ def get_full_message(message_id):
 
         body = msg.get('body', '')
         created_at = msg.get('createdAt', msg.get('created_at'))
+        if body and created_at is not None:
+            app.message_cache.put(message_id, body, created_at)
 
         return body, created_at
     else:
         logger.error(f'Failed to retrieve full message for ID {message_id}: {response.text}')
         return None, None
 
-# Client Processing Module
-def normalize_name(name):
-    if not isinstance(name, str):
-        name = str(name) if name is not None else ''
-    
-    turkish_char_map = {
-        'ç': 'c', 'Ç': 'C',
-        'ğ': 'g', 'Ğ': 'G',
-        'ı': 'i', 'İ': 'I',
-        'ö': 'o', 'Ö': 'O',
-        'ş': 's', 'Ş': 'S',
-        'ü': 'u', 'Ü': 'U'
-    }
-    name_variants = {
-        'MUHAMMED': ['MUHAMMET', 'MOHAMMED', 'MOHAMET'],
-        'MUHAMMET': ['MUHAMMED', 'MOHAMMED', 'MOHAMET'],
-        'MOHAMMED': ['MUHAMMED', 'MUHAMMET', 'MOHAMET'],
-        'MOHAMET': ['MUHAMMED', 'MUHAMMET', 'MOHAMMED'],
-        'MEHMET': ['MEHMED','MEMET'],
-        'MEHMED': ['MEHMET','MEMET'],
-        'MEMET': ['MEHMET','MEHMED'],
-    }
-    normalized_name = ''.join(turkish_char_map.get(char, char) for char in name)
-    for key, variants in name_variants.items():
-        if normalized_name in variants or normalized_name == key:
-            normalized_name = key
-            break
-    return normalized_name.upper()
+class AsyncMissiveClient:
+    """
+    fetch_conversation_messages ve eksik gövdeler için get_full_message çağrılarını asyncio ile eşzamanlı çalıştırır.
+    Aynı anda en fazla `concurrency` istek açık olur; sonuçlar konuşma sırasıyla döner.
+    """
+
+    def __init__(self, concurrency=MAX_CONCURRENT_REQUESTS):
+        self.concurrency = concurrency
+        self._semaphore = None
+
+    async def _call(self, func, *args):
+        async with self._semaphore:
+            return await asyncio.to_thread(func, *args)
+
+    async def fetch_conversation(self, conversation):
+        messages = await self._call(fetch_conversation_messages, conversation.id)
+        full_messages = await asyncio.gather(*(self._message_content(message) for message in messages))
+        return messages, full_messages
+
+    async def _message_content(self, message):
+        if message.body and message.created_at:
+            return message.body, message.created_at
+        return await self._call(get_full_message, message.id)
+
+    async def _fetch_conversations(self, conversations):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(
+            *(self.fetch_conversation(conversation) for conversation in conversations),
+            return_exceptions=True,
+        )
+
+    def fetch_conversations(self, conversations):
+        """Her konuşma için (messages, [(body, created_at), ...]) ya da hata olduysa Exception döner."""
+        if not conversations:
+            return []
+        return asyncio.run(self._fetch_conversations(conversations))
 
 def parse_created_at(timestamp):
+    if isinstance(timestamp, datetime):
+        return timestamp
     if isinstance(timestamp, (int, float)):
         # Unix timestamp ini datetime objesine dönüştür
         return datetime.fromtimestamp(timestamp, timezone.utc)
@@ -307,24 +420,6 @@ def parse_created_at(timestamp):
         logger.error(f"Unrecognized type for timestamp: {type(timestamp)}")
         return None
 
-
-def extract_client_details_from_body(body):
-    soup = BeautifulSoup(body, 'html.parser')
-    text = soup.get_text(separator=' ')
-    
-    client_name_match = re.search(r'Noncitizen Name:\s*([^,]+),\s*(.+)', text)
-    if client_name_match:
-        surname = client_name_match.group(1).strip()
-        first_name = client_name_match.group(2).strip()
-    else:
-        surname = None
-        first_name = None
-
-    return {
-        'first_name': first_name,
-        'surname': surname,
-    }
-
 # Assignment Module
 def apply_assignment_rules(paralegal_name):
     if paralegal_name is None or (isinstance(paralegal_name, float) and math.isnan(paralegal_name)):
@@ -335,60 +430,67 @@ def apply_assignment_rules(paralegal_name):
         paralegal_name = "Ismail Dislik"
     return paralegal_name
 
-def match_client_to_originating_attorney(client_details, a_number=None):
+def assignees_for(paralegal_name):
+    """Kurallar uygulandıktan sonra konuşmanın atanacağı bütün paralegal'ler, ana paralegal ilk sırada."""
+    paralegal_name = apply_assignment_rules(paralegal_name)
+    if paralegal_name is None:
+        return []
+    return [paralegal_name] + ASSIGNEE_TEAMS.get(paralegal_name, [])
+
+def match_client_to_originating_attorney(notice):
     """
-    Verilen client detaylarına göre originating attorney bilgisini döner.
+    Verilen bildirim kaydına göre originating attorney bilgisini döner.
 
     Args:
-        client_details (dict): {'first_name': '...', 'surname': '...'}
-        a_number (str, optional): A-Number varsa ek eşleştirme için kullanılır.
+        notice (NoticeDetails): Mailden çıkarılan isim, soyisim ve varsa A-Number.
 
     Returns:
         str or None: Originating attorney adı ya da eşleşme bulunamazsa None.
     """
-    full_name = f"{client_details.get('first_name', '')} {client_details.get('surname', '')}".strip().upper()
-    normalized_full_name = normalize_name(full_name)
-    surname = normalize_name(client_details.get('surname', ''))
-
-    # 1. Tam eşleşme
-    for client in clients:
-        client_full_name = f"{client.first_name} {client.last_name}".strip().upper()
-        if normalize_name(client_full_name) == normalized_full_name:
+    normalized_full_name = normalize_name(notice.full_name.upper())
+    surname = normalize_name(notice.surname or '')
+    a_number = notice.a_number
+
+    # 1. A Number ile eşleşme
+    if a_number:
+        client = app.roster.find_by_a_number(a_number)
+        if client:
             return client.originating_attorney if client.originating_attorney else None
 
-    # 2. Tekil soyad eşleşmesi
-    surname_matches = [client for client in clients if normalize_name(client.last_name) == surname]
+    # 2. Tam eşleşme
+    client = app.roster.find_by_full_name(normalized_full_name)
+    if client:
+        return client.originating_attorney if client.originating_attorney else None
+
+    # 3. Tekil soyad eşleşmesi
+    surname_matches = app.roster.find_by_surname(surname)
     if len(surname_matches) == 1:
         return surname_matches[0].originating_attorney if surname_matches[0].originating_attorney else None
 
-    # 3. A Number ile eşleşme (ileride eklenecekse kullanılabilir)
-    if a_number:
-        for client in clients:
-            if getattr(client, 'a_number', None) == a_number:
-                return client.originating_attorney if client.originating_attorney else None
-
     return None
 
 
-def match_client_to_paralegal(client_details,a_number=None):
-    full_name = f"{client_details.get('first_name', '')} {client_details.get('surname', '')}".strip().upper()
-    normalized_full_name = normalize_name(full_name)
-    surname = normalize_name(client_details.get('surname', ''))
+def match_client_to_paralegal(notice):
+    normalized_full_name = normalize_name(notice.full_name.upper())
+    surname = normalize_name(notice.surname or '')
+    a_number = notice.a_number
     #logger.info(full_name)
-    matched_clients = []
 
-    # Tam isim ve soyisim eşleşmesi
-    for client in clients:
-        client_full_name = f"{client.first_name} {client.last_name}".strip().upper()
-        normalized_client_full_name = normalize_name(client_full_name)
+    # A numarası en güvenilir anahtar, isim heuristiklerinden önce dene
+    if a_number:
+        client = app.roster.find_by_a_number(a_number)
+        if client:
+            paralegal = client.lead_attorney or client.originating_attorney
+            if paralegal:
+                logger.info(f"A numarası ({a_number}) ile eşleşme sağlandı. Mail {paralegal} isimli paralegal'e atandı.")
+                return paralegal
 
-        if normalized_full_name == normalized_client_full_name:
-            matched_clients.append(client)
-            break  # Tam eşleşme bulundu
+    # Tam isim ve soyisim eşleşmesi
+    client = app.roster.find_by_full_name(normalized_full_name)
 
-    if not matched_clients:
+    if not client:
         # İsim ve soyisim tam eşleşmesi yoksa, soyisimle eşleşenleri bulalım
-        surname_matches = [client for client in clients if normalize_name(client.last_name) == surname]
+        surname_matches = app.roster.find_by_surname(surname)
 
         if len(surname_matches) == 1:
             # Mycase üzerindeki kişilerde tek bir soyisim eşleşmesi varsa assign et geç
@@ -396,23 +498,11 @@ def match_client_to_paralegal(client_details,a_number=None):
             if client.lead_attorney != '':
                 return client.lead_attorney
             elif client.originating_attorney != '':
-                logger.info(f" {normalized_client_full_name} için Lead Attorney bulunamadı, Originating Attorney atanıyor: {client.originating_attorney}")
+                logger.info(f" {client.first_name} {client.last_name} için Lead Attorney bulunamadı, Originating Attorney atanıyor: {client.originating_attorney}")
                 return client.originating_attorney
-        else:
-            # Birden fazla veya hiç eşleşme yoksa
-                  
-            # Eğer isim veya soyisimle eşleşme yoksa, A numarasıyla eşleşmeyi dene
-            if a_number:
-                for client in clients:
-                    client_a_number = getattr(client, 'a_number', None)  # CSV dosyasındaki A numarasını kontrol et
-                    if client_a_number and client_a_number == a_number:
-                        paralegal = client.lead_attorney or client.originating_attorney
-                        logger.info(f"A numarası ({a_number}) ile eşleşme sağlandı. Mail {paralegal} isimli paralegal'e atandı.")
-                        return paralegal
-                        return None
+        # Birden fazla veya hiç eşleşme yoksa manuel kontrol
     else:
         # Tam eşleşme bulundu
-        client = matched_clients[0]
         if client.lead_attorney:
             return client.lead_attorney
         elif client.originating_attorney:
@@ -423,83 +513,236 @@ def match_client_to_paralegal(client_details,a_number=None):
 
 
 
-def assign_conversation_to_paralegal(conversation_id, paralegal_name):
-    if paralegal_name is None:
-        logger.error(f"No paralegal name provided for conversation {conversation_id}.")
-        return False
-    paralegal_user = find_closest_missive_user_name(paralegal_name, test.users, cutoff_ratio=0.8)
+def assign_conversation(conversation_id, paralegal_names):
+    """Konuşmayı tek bir post ile listedeki bütün paralegal'lere atar (tek istek, tek bildirim)."""
+    names = []
+    user_ids = []
+    for paralegal_name in paralegal_names:
+        if not paralegal_name:
+            continue
+        paralegal_user = app.user_directory.resolve(paralegal_name)
+        if not paralegal_user:
+            logger.error(f"Paralegal '{paralegal_name}' not found in Missive users.")
+            continue
+        if paralegal_user['id'] not in user_ids:
+            user_ids.append(paralegal_user['id'])
+            names.append(paralegal_name)
 
-    if not paralegal_user:
-        logger.error(f"Paralegal '{paralegal_name}' not found in Missive users.")
+    if not user_ids:
+        logger.error(f"No assignable paralegal for conversation {conversation_id}.")
+        ASSIGNMENTS.inc(result='unresolved')
         return False
+    claimed = app.assignment_ledger.claim(conversation_id, user_ids)
+    if claimed is None:
+        # Yarım kalmış önceki denemenin sonucu doğrulanamadı; sonraki poll tekrar dener
+        ASSIGNMENTS.inc(result='failed')
+        return False
+    if not claimed:
+        logger.info(f"Conversation {conversation_id} was already assigned to {', '.join(names)}, skipping.")
+        ASSIGNMENTS.inc(result='duplicate')
+        return True
 
-    user_id = paralegal_user['id']
-
-    url = 'https://public.missiveapp.com/v1/posts'
-    headers = {
-        'Authorization': f'Bearer {test.MISSIVE_API_KEY}',
-        'Content-Type': 'application/json'
-    }
+    assignee_names = ", ".join(names)
     data = {
         "posts": {
             "conversation": conversation_id,
-            "add_assignees": [user_id],
+            "add_assignees": user_ids,
             "organization": 'f50f2ccf-e588-4b56-bb15-672a515e0e1e',
-            "text": f"{paralegal_name}",
+            "text": assignee_names,
             "notification": {
                 "title": "Assignment Notification",
-                "body": f"{paralegal_name}"
+                "body": assignee_names
             }
         }
     }
 
     try:
-        response = requests.post(url, json=data, headers=headers)
+        response = app.missive.post('/posts', json=data)
         response.raise_for_status()
-        
-        logger.info(f"Conversation {conversation_id} assigned to {paralegal_name}.")
-        return True
     except requests.exceptions.HTTPError as e:
+        app.assignment_ledger.release(conversation_id, user_ids)
         logger.error(f"Failed to assign conversation {conversation_id}: {e.response.status_code} - {e.response.text}")
+        ASSIGNMENTS.inc(result='failed')
         return False
+    except Exception:
+        app.assignment_ledger.release(conversation_id, user_ids)
+        ASSIGNMENTS.inc(result='failed')
+        raise
+
+    app.assignment_ledger.confirm(conversation_id, user_ids)
+    ASSIGNMENTS.inc(result='posted')
+    logger.info(f"Conversation {conversation_id} assigned to {assignee_names}.")
+    return True
+
+
+def assign_conversation_to_paralegal(conversation_id, paralegal_name):
+    if paralegal_name is None:
+        logger.error(f"No paralegal name provided for conversation {conversation_id}.")
+        return False
+    return assign_conversation(conversation_id, [paralegal_name])
 
 # main module
 def run_assignment_process():
-    
-    end_date = datetime.now(timezone.utc)
-    start_date = end_date - timedelta(days=3)  # 3 gün geriden kontrol
-    conversations = fetch_unassigned_conversations(EOIR_TEAM_ID, start_date=start_date, end_date=end_date)
-    if not conversations:
-        return
+    with metrics.stage('cycle'):
+        end_date = datetime.now(timezone.utc)
+        # Normalde sadece son checkpoint'ten beri değişenler, arada bir 3 günlük pencerenin tamamı
+        full_sweep = app.checkpoint.is_full_sweep_due(end_date)
+        start_date = app.checkpoint.window_start(end_date, full_sweep)
+        conversations = iter_unassigned_conversations(EOIR_TEAM_ID, start_date=start_date, end_date=end_date)
+        if not full_sweep:
+            conversations = (c for c in conversations if not app.checkpoint.is_handled(c))
+        logger.info(f"{'Full sweep' if full_sweep else 'Incremental poll'} since {start_date.isoformat()}")
+
+        # Sayfalar geldikçe işlenir; konuşmalar yeniden eskiye geldiği için aile grupları tarama bitmeden kapanabilir
+        processed = process_conversations(prefetch(conversations, STREAM_BUFFER_SIZE), newest_first=True)
+        logger.info(f"{processed} conversation(s) processed")
+        CONVERSATIONS.inc(processed, source='full_sweep' if full_sweep else 'poll')
+        with metrics.stage('checkpoint'):
+            app.checkpoint.complete_cycle(end_date, full_sweep)
+
+
+def process_conversations(conversations, newest_first=False):
+    """
+    Konuşmaları akış halinde işler: STREAM_BATCH_SIZE'lık parçalar halinde mesajları çekilir,
+    parse edilir ve aile grup buffer'ına eklenir; bellekte bütün tarama değil sadece açık aile
+    grupları tutulur. `newest_first` ise (polling sırası) kapanan gruplar her parçadan sonra
+    atanır, değilse hepsi sonda. Aile grupları önceki cycle'ların state'iyle birleştirilir.
+    Mailleri eksiksiz çekilip ataması yapılan (ya da bilerek manuel review'a bırakılan) konuşmalar
+    checkpoint'e işlenir; çekme ya da atama hatası olanlar sonraki poll'da tekrar denenir.
+    İşlenen konuşma sayısı döner.
+    """
+    client = AsyncMissiveClient(MAX_CONCURRENT_REQUESTS)
+    failed = set()  # ataması başarısız olan konuşma ID'leri
+    families = FamilyGroupBuffer(
+        timedelta(minutes=TIME_WINDOW_MINUTES),
+        lambda group, previous: assign_family_group(group, previous, failed=failed),
+        state=app.family_state,
+    )
+    fetched = []
+    incomplete = []
+    processed = 0
+    conversations = iter(conversations)
+    while True:
+        chunk = list(islice(conversations, STREAM_BATCH_SIZE))
+        if not chunk:
+            break
+        processed += len(chunk)
+        complete = process_conversation_chunk(client, chunk, families)
+        fetched.extend(conversation for conversation in chunk if conversation.id in complete)
+        incomplete.extend(conversation for conversation in chunk if conversation.id not in complete)
+        if newest_first:
+            # Bundan sonraki konuşmaların mailleri en fazla bu kadar yeni olabilir
+            with metrics.stage('assign'):
+                families.advance(min(conversation.last_activity for conversation in chunk))
+
+    with metrics.stage('assign'):
+        families.flush()
+    app.family_state.save()
+
+    for conversation in fetched:
+        if conversation.id in failed:
+            incomplete.append(conversation)
+        else:
+            app.checkpoint.mark_handled(conversation)
+    for conversation in incomplete:
+        app.checkpoint.mark_failed(conversation)
+    if incomplete:
+        logger.warning(f"{len(incomplete)} conversation(s) could not be fully processed, will retry on the next poll")
+    return processed
 
-    all_messages = []
 
-    for conversation in conversations:
+def process_conversation_chunk(client, conversations, families):
+    """
+    Bir parça konuşmanın mesajlarını çeker, parse edip EOIR bildirimlerini `families`'e ekler.
+    Bütün mesajları çekilebilen konuşmaların ID'lerini döner.
+    """
+    complete = set()
+    pending = []  # (conversation, message), gövdeler çekme bitince parse edilecek
+
+    with metrics.stage('fetch_messages'):
+        results = client.fetch_conversations(conversations)
+    for conversation, result in zip(conversations, results):
+        if isinstance(result, Exception):
+            logger.error(f"An error occurred while fetching conversation {conversation.id}", exc_info=result)
+            continue
+        messages, full_messages = result
         try:
-            messages = fetch_conversation_messages(conversation.id)
-            if messages:
-                for message in messages:
-                    body, created_at_str = get_full_message(message.id)
-                    if not body:
-                        continue
-                    message.body = body
-                    created_at = parse_created_at(created_at_str)
-                    if not created_at:
-                        continue
-                    message.created_at = created_at
-                    client_details = extract_client_details_from_body(body)
-                    if not client_details['surname']:
-                        continue
-                    message.client_details = client_details
-                    message.conversation_id = conversation.id
-                    all_messages.append(message)
+            if not messages:
+                continue  # hata da olabilir, sonraki poll tekrar bakar
+            fetched_all = True
+            for message, (body, created_at_str) in zip(messages, full_messages):
+                if body is None:
+                    fetched_all = False  # get_full_message başarısız oldu
+                    continue
+                if not body:
+                    continue
+                message.body = body
+                created_at = parse_created_at(created_at_str)
+                if not created_at:
+                    continue
+                message.created_at = created_at
+                pending.append((conversation, message))
+            if fetched_all:
+                complete.add(conversation.id)
         except Exception as e:
             logger.exception(f"An error occurred while processing conversation {conversation.id}")
 
-    # Group ve assign
-    group_and_assign_messages(all_messages)
+    # Parça seri parse edilir: 25 gövde ~3 ms, çekmeleri ise rate limit yüzünden saniyeler sürüyor
+    with metrics.stage('parse'):
+        notices = [extract_notice_details(message.body) for _, message in pending]
+    for (conversation, message), notice in zip(pending, notices):
+        NOTICES.inc(result='notice' if notice.surname else 'no_notice')
+        if not notice.surname:
+            continue
+        message.notice = notice
+        message.conversation_id = conversation.id
+        message.body = ''  # gövde parse edildi, grup kapanana kadar bellekte tutulmasın
+        families.add(message)
+    return complete
 
 
+def process_webhook_events(events):
+    """Webhook'tan gelen konuşmaları polling'i beklemeden pipeline'a verir."""
+    conversations = []
+    for event in events:
+        if event.assignees:
+            continue  # Missive'de zaten birine atanmış
+        last_activity = parse_created_at(event.last_activity_at) if event.last_activity_at is not None else None
+        conversation = Conversation(
+            id=event.conversation_id,
+            last_activity=last_activity or datetime.now(timezone.utc),
+            messages=[]
+        )
+        if not app.checkpoint.is_handled(conversation):
+            conversations.append(conversation)
+    if not conversations:
+        return
+    logger.info(f"Webhook: {len(conversations)} conversation(s) to process")
+    CONVERSATIONS.inc(len(conversations), source='webhook')
+    with metrics.stage('webhook_cycle'):
+        process_conversations(conversations)
+        app.checkpoint.save()
+
+
+def run_webhook_mode(receiver):
+    receiver.start()
+    next_poll = 0.0
+    while True:
+        refresh_roster()
+        if time.monotonic() >= next_poll:
+            try:
+                run_assignment_process()
+            except Exception as e:
+                logger.exception("An error occurred during the assignment process.")
+            next_poll = time.monotonic() + WEBHOOK_SAFETY_POLL_SECONDS
+        # En geç dakikada bir uyan ki roster yenilemesi ve güvenlik polling'i gecikmesin
+        events = receiver.drain(timeout=min(next_poll - time.monotonic(), 60))
+        if events:
+            try:
+                process_webhook_events(events)
+            except Exception as e:
+                logger.exception("An error occurred while processing webhook events.")
+
 
 def process_conversation(conversation, assigned_paralegals):
     messages = fetch_conversation_messages(conversation.id)
@@ -513,69 +756,62 @@ def process_conversation(conversation, assigned_paralegals):
         except Exception as e:
             logger.exception(f"An error occurred while processing message {message.id}")
 def group_and_assign_messages(messages):
-    # Group messages by surname
-    messages_by_surname = {}
+    families = FamilyGroupBuffer(timedelta(minutes=TIME_WINDOW_MINUTES), assign_family_group)
     for message in messages:
-        surname = normalize_name(message.client_details['surname'])
-        if surname not in messages_by_surname:
-            messages_by_surname[surname] = []
-        messages_by_surname[surname].append(message)
-
-    # For each surname, group messages by time window and assign
-    for surname, messages_list in messages_by_surname.items():
-        # Sort messages by created_at
-        messages_list.sort(key=lambda m: m.created_at)
-
-        # Group messages into time windows
-        groups = []
-        current_group = [messages_list[0]]
-        for i in range(1, len(messages_list)):
-            time_diff = (messages_list[i].created_at - messages_list[i-1].created_at).total_seconds() / 60
-            if time_diff <= TIME_WINDOW_MINUTES:
-                current_group.append(messages_list[i])
-            else:
-                groups.append(current_group)
-                current_group = [messages_list[i]]
-        groups.append(current_group)  # Add the last group
-        
-        # Aile olan müvekkillerin sadece başvuranın bilgileri Mycase'te oluyor, fakat bütün aile üyeleriyle ilgili
-        # mail gelebiliyor, bu durumda belli bir timeframe içerisinde gelen mailleri gruplayıp soyadı aynı olan bütün müvekkilleri tek bir paralegale assign edebiliriz.
-        
-        # For each group, attempt to match to a paralegal and assign
-        for group in groups:
-            paralegal_name = None
-            # Try to find a paralegal for any message in the group
-            for message in group:
-                paralegal_name = match_client_to_paralegal(message.client_details)
-                if paralegal_name:
-                    paralegal_name = apply_assignment_rules(paralegal_name)
-                    break  # Found a paralegal, no need to check other messages
-            if paralegal_name:
-                # Assign all messages in the group to the paralegal
-                for message in group:
-                    assign_conversation_to_paralegal(message.conversation_id, paralegal_name)
-                    if paralegal_name == "Ismail Dislik":
-                        assign_conversation_to_paralegal(message.conversation_id, "Arda Mert Geldi")
-                        assign_conversation_to_paralegal(message.conversation_id, "Elifsu Coban")
-                    
-            else:
-                # No paralegal found, log for manual review
-                for message in group:
-                    full_name = f"{message.client_details.get('first_name', '')} {message.client_details['surname']}".strip()
-                    logger.info(f"No paralegal found for '{full_name}'. Please review manually.")
+        families.add(message)
+    families.flush()
+
+
+def assign_family_group(group, previous=None, failed=None):
+    """
+    Grubun konuşmalarını bir paralegal'e atar, atanan paralegal'i (yoksa None) döner. `previous` önceki
+    cycle'dan aynı ailenin kaydı; `failed` verilirse ataması başarısız olan konuşmalar ona eklenir.
+    """
+    # Aile olan müvekkillerin sadece başvuranın bilgileri Mycase'te oluyor, fakat bütün aile üyeleriyle ilgili
+    # mail gelebiliyor, bu durumda belli bir timeframe içerisinde gelen mailleri gruplayıp soyadı aynı olan bütün müvekkilleri tek bir paralegale assign edebiliriz.
+    messages = group.messages
+    paralegal_name = None
+    # Try to find a paralegal for any message in the group
+    for message in messages:
+        paralegal_name = match_client_to_paralegal(message.notice)
+        if paralegal_name:
+            paralegal_name = apply_assignment_rules(paralegal_name)
+            break  # Found a paralegal, no need to check other messages
+    conversation_ids = group.conversation_ids
+    if previous is not None:
+        if not paralegal_name and previous.paralegal:
+            # Ailenin önceki poll'da gelen maili eşleşmişti
+            paralegal_name = previous.paralegal
+            logger.info(f"Family '{group.surname}' assigned to {paralegal_name} from an earlier cycle.")
+        elif paralegal_name and not previous.paralegal:
+            # Önceki poll'da eşleşmeyen kardeşler bu grupla birlikte atanır; o arada elle
+            # triage edilmiş olabilecekleri için sadece hâlâ atanmamış olanlar
+            earlier = [cid for cid in previous.conversations
+                       if cid not in conversation_ids and conversation_is_unassigned(cid)]
+            conversation_ids = earlier + conversation_ids
+    if paralegal_name:
+        # Assign all messages in the group to the paralegal
+        assignees = assignees_for(paralegal_name)
+        # Aynı konuşmanın birden fazla maili grupta olabilir, konuşma başına bir kere
+        for conversation_id in conversation_ids:
+            if not assign_conversation(conversation_id, assignees) and failed is not None:
+                failed.add(conversation_id)
+    else:
+        # No paralegal found, log for manual review
+        for message in messages:
+            logger.info(f"No paralegal found for '{message.notice.full_name}'. Please review manually.")
+    return paralegal_name
 
 
 def process_message(message, assigned_paralegals):
-    body, created_at_str = get_full_message(message.id)
+    body, created_at_str = get_message_content(message)
     if not body:
         return
 
-    client_details = extract_client_details_from_body(body)
-    if not client_details['surname']:
+    notice = extract_notice_details(body)
+    if not notice.surname:
         return
 
-    a_number_match = re.search(r'\b(\d{3}-\d{3}-\d{3}|\d{9})\b', body)
-    a_number = a_number_match.group(0) if a_number_match else None
     # Parse the created_at timestamp
     created_at = parse_created_at(created_at_str)
     if not created_at:
@@ -583,9 +819,9 @@ def process_message(message, assigned_paralegals):
     message.created_at = created_at
     message.body = body
 
-    surname = client_details['surname']
-    full_name = f"{client_details.get('first_name', '')} {surname}".strip()
-    paralegal_name = match_client_to_paralegal(client_details, a_number)
+    surname = notice.surname
+    full_name = notice.full_name
+    paralegal_name = match_client_to_paralegal(notice)
     paralegal_name = apply_assignment_rules(paralegal_name)
 
     # Update assigned_paralegals regardless of whether a paralegal was found
@@ -610,22 +846,52 @@ def process_message(message, assigned_paralegals):
         }
 
     if paralegal_name:
-        assign_conversation_to_paralegal(message.conversation_id, paralegal_name)
-        if paralegal_name == "Ismail Dislik":
-            assign_conversation_to_paralegal(message.conversation_id, "Arda Mert Geldi")
-            assign_conversation_to_paralegal(message.conversation_id, "Elifsu Coban")
+        assign_conversation(message.conversation_id, assignees_for(paralegal_name))
     else:
         logger.info(f"No paralegal found for '{full_name}'. Please review manually.")
+def refresh_roster():
+    # Yeni MyCase export'u arka planda yüklendiyse cycle'lar arasında roster'ı değiştir
+    new_roster = app.roster_reloader.poll()
+    if new_roster is not None:
+        app.roster = new_roster
+        logger.info(f"Client roster swapped: {len(new_roster.clients)} clients")
+
 # Main Loop
-def main():
-    
-    
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Assign EOIR notices in Missive to paralegals")
+    p.add_argument("--once", action="store_true", help="Run a single assignment cycle and exit")
+    p.add_argument("--webhook", action="store_true",
+                   help="Assign on Missive webhooks, polling only every %d minutes as a safety net" % (WEBHOOK_SAFETY_POLL_SECONDS // 60))
+    p.add_argument("--host", default="0.0.0.0", help="Webhook listen address (default %(default)s)")
+    p.add_argument("--port", type=int, default=8080, help="Webhook listen port (default %(default)s)")
+    p.add_argument("--metrics-host", default="127.0.0.1", help="Prometheus metrics listen address (default %(default)s)")
+    p.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                   help="Prometheus metrics port, 0 to disable (default %(default)s)")
+    p.add_argument("--metrics-file", default=METRICS_FILE,
+                   help="With --once, write metrics in Prometheus text format to this file (default %(default)s)")
+    args = p.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.once:
+        try:
+            run_assignment_process()
+        finally:
+            if args.metrics_file:
+                metrics.registry.write(args.metrics_file)
+        return
+    if args.metrics_port:
+        metrics.MetricsServer(args.metrics_host, args.metrics_port).start()
+    if args.webhook:
+        run_webhook_mode(WebhookReceiver(test.get_webhook_secret(), host=args.host, port=args.port))
+        return
+
     while True:
+        refresh_roster()
         try:
             run_assignment_process()
         except Exception as e:
             logger.exception("An error occurred during the assignment process.")
-        time.sleep(150)
+        time.sleep(POLL_INTERVAL_SECONDS)
         #shutdown()
         
 
@@ -638,6 +904,7 @@ def create_filtered_csv():
   
         try:
             # Büyük CSV dosyasını oku
+            import pandas as pd  # sadece bu yardımcıda gerekli, import süresini uzatmasın
             logger.info("Reading the main CSV file...")
             df = pd.read_csv(CSV_FILE_PATH)
 
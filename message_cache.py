@@ -0,0 +1,82 @@
+import json
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MessageCache:
+    """
+    Missive mesajları değişmediği için gövdeleri message ID ile SQLite'ta saklar.
+    Kayıt sayısı `max_entries` ile sınırlı (en uzun süredir okunmayanlar silinir),
+    `max_age_seconds`'tan eski kayıtlar da atılır.
+    """
+
+    EVICT_EVERY = 500  # bu kadar yazmada bir temizlik yap
+
+    def __init__(self, path, max_entries=50_000, max_age_seconds=30 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                created_at TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS messages_accessed_at ON messages (accessed_at)")
+        self.evict()
+
+    def get(self, message_id):
+        """(body, created_at) ya da cache'te yoksa None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body, created_at FROM messages WHERE id = ? AND fetched_at >= ?",
+                (message_id, now - self.max_age_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE messages SET accessed_at = ? WHERE id = ?", (now, message_id))
+        body, created_at = row
+        return body, json.loads(created_at) if created_at is not None else None
+
+    def put(self, message_id, body, created_at):
+        now = time.time()
+        # created_at unix timestamp ya da ISO string olabilir, tipi korunsun diye JSON olarak saklanır
+        created_at = json.dumps(created_at) if created_at is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO messages (id, body, created_at, fetched_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (message_id, body, created_at, now, now),
+            )
+            self._writes += 1
+            evict = self._writes % self.EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        with self._lock:
+            expired = self._conn.execute(
+                "DELETE FROM messages WHERE fetched_at < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+            overflow = self._conn.execute(
+                "DELETE FROM messages WHERE id IN (SELECT id FROM messages ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        if expired or overflow:
+            logger.info(f"Message cache evicted {expired} expired and {overflow} least recently used entries")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,249 @@
+"""
+Missive API çağrıları için ortak istemci katmanı.
+
+Bütün script'ler (main4, main3, archive, test) Missive'e bu modül üzerinden istek atar,
+böylece tek bir rate limiter bütün trafiği Missive limitleri içinde tutar ve istekler
+keep-alive bağlantı havuzu olan tek bir Session'ı paylaşır (her istekte yeni TLS handshake yok).
+"""
+import re
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Missive API limitleri: dakikada 300, 15 dakikada 900 istek ve aynı anda en fazla 5 istek
+RATE_LIMITS = [(300, 60), (900, 15 * 60)]
+# Bir anda harcanabilecek istek sayısı; kalanı limit/pencere hızıyla gelir, böylece hiçbir pencerede limit aşılmaz
+RATE_LIMIT_BURST = 5
+MAX_CONCURRENT_REQUESTS = 5
+MAX_RATE_LIMIT_RETRIES = 5
+DEFAULT_RETRY_AFTER = 1
+
+MISSIVE_API_URL = 'https://public.missiveapp.com/v1'
+DEFAULT_TIMEOUT = (5, 30)  # (bağlantı, okuma) saniye
+# Geçici sunucu/bağlantı hatalarında sadece idempotent istekler tekrar denenir; 429'u rate limiter yönetir
+CONNECTION_RETRIES = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=(500, 502, 503, 504),
+    allowed_methods=frozenset({'GET', 'DELETE'}),
+    raise_on_status=False,
+    respect_retry_after_header=False,  # yoksa urllib3 429'u kendisi tekrar dener, limiter ve metrikler görmez
+)
+# Path'teki konuşma/mesaj ID'leri endpoint etiketinde {id} olur, yoksa her konuşma ayrı bir seri açar
+_ID_SEGMENT = re.compile(r'^(?:\d+|(?=[^/]*\d)[A-Za-z0-9_-]{8,})$')
+
+REQUESTS = metrics.counter('missive_requests_total', 'Missive API responses by endpoint and status code',
+                           ['method', 'endpoint', 'status'])
+REQUEST_SECONDS = metrics.histogram('missive_request_seconds', 'Missive API request latency', ['method', 'endpoint'])
+RATE_LIMIT_HITS = metrics.counter('missive_rate_limit_hits_total', 'Missive responses with status 429', ['endpoint'])
+RATE_LIMIT_WAIT_SECONDS = metrics.counter('missive_rate_limit_wait_seconds_total',
+                                          'Time requests spent waiting for the rate limiter')
+
+
+def endpoint_label(url):
+    """'https://public.missiveapp.com/v1/conversations/<uuid>/messages?x=1' -> '/v1/conversations/{id}/messages'"""
+    segments = urlsplit(url).path.split('/')
+    return '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment for segment in segments) or '/'
+
+
+class TokenBucket:
+    """
+    `period` saniyelik herhangi bir pencerede en fazla `limit` token verir: kova `burst` token alır
+    ve (limit - burst) / period hızıyla dolar, yani burst + rate * period <= limit.
+    """
+
+    def __init__(self, limit, period, burst=RATE_LIMIT_BURST):
+        self.capacity = min(burst, limit)
+        self.rate = (limit - self.capacity) / period  # saniyede eklenen token
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now):
+        """Bir token için beklenmesi gereken süre (saniye), 0 ise token hazır."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def limit_remaining(self, remaining, now):
+        # Sunucu daha az hak kaldığını söylüyorsa ona uy
+        self._refill(now)
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class RateLimiter:
+    """Birden fazla token bucket ve sunucunun Retry-After / rate-limit header'larına göre bekletir."""
+
+    def __init__(self, limits=RATE_LIMITS):
+        self.buckets = [TokenBucket(limit, period) for limit, period in limits]
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max([self.blocked_until - now] + [bucket.wait_time(now) for bucket in self.buckets])
+                if wait <= 0:
+                    for bucket in self.buckets:
+                        bucket.take()
+                    return
+            time.sleep(wait)
+
+    def block_for(self, seconds):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update_from_response(self, response):
+        """429 ise Retry-After kadar bütün istekleri durdurur, rate-limit header'larına göre bucket'ları ayarlar."""
+        headers = response.headers
+        if response.status_code == 429:
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+            self.block_for(retry_after if retry_after is not None else DEFAULT_RETRY_AFTER)
+            return
+
+        remaining = _header_number(headers, 'X-RateLimit-Remaining')
+        if remaining is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for bucket in self.buckets:
+                bucket.limit_remaining(remaining, now)
+        if remaining <= 0:
+            reset = _header_number(headers, 'X-RateLimit-Reset')
+            if reset is not None:
+                # Reset ya kalan saniye ya da epoch zamanı olarak gelir
+                seconds = reset - time.time() if reset > 10**9 else reset
+                self.block_for(max(seconds, 0))
+
+
+def _header_number(headers, name):
+    value = headers.get(name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_retry_after(value):
+    """Retry-After saniye ya da HTTP tarihi olabilir; saniye cinsinden döner."""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+rate_limiter = RateLimiter()
+_concurrency = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+_session = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,  # sadece public.missiveapp.com
+        pool_maxsize=MAX_CONCURRENT_REQUESTS,
+        max_retries=CONNECTION_RETRIES,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def request(method, url, **kwargs):
+    """requests.request ile aynı, fakat ortak Session ve rate limiter'dan geçer, 429'da bekleyip tekrar dener."""
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    session = get_session()
+    endpoint = endpoint_label(url)
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        waited_at = time.perf_counter()
+        rate_limiter.acquire()
+        started_at = time.perf_counter()
+        RATE_LIMIT_WAIT_SECONDS.inc(started_at - waited_at)
+        try:
+            with _concurrency:
+                response = session.request(method, url, **kwargs)
+        except requests.RequestException:
+            REQUESTS.inc(method=method, endpoint=endpoint, status='error')
+            raise
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started_at, method=method, endpoint=endpoint)
+        REQUESTS.inc(method=method, endpoint=endpoint, status=response.status_code)
+        rate_limiter.update_from_response(response)
+        if response.status_code == 429:
+            RATE_LIMIT_HITS.inc(endpoint=endpoint)
+        if response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+            return response
+        logger.warning(f"Rate limit hit on {method} {url}, retrying (attempt {attempt + 1}/{MAX_RATE_LIMIT_RETRIES})")
+    return response
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+
+class MissiveClient:
+    """Bir API anahtarıyla Missive'e istek atar; path'ler MISSIVE_API_URL'e göredir ('/conversations')."""
+
+    def __init__(self, api_key, base_url=MISSIVE_API_URL):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, headers=None, **kwargs):
+        url = path if path.startswith('http') else f"{self.base_url}{path}"
+        headers = {'Authorization': f'Bearer {self.api_key}', **(headers or {})}
+        return request(method, url, headers=headers, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
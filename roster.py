@@ -0,0 +1,381 @@
+import re
+import os
+import math
+import pickle
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Snapshot formatı ya da roster oluşturma mantığı değişirse artır, eski snapshot'lar yeniden üretilir
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SUFFIX = '.roster'
+
+TURKISH_CHAR_MAP = {
+    'ç': 'c', 'Ç': 'C',
+    'ğ': 'g', 'Ğ': 'G',
+    'ı': 'i', 'İ': 'I',
+    'ö': 'o', 'Ö': 'O',
+    'ş': 's', 'Ş': 'S',
+    'ü': 'u', 'Ü': 'U'
+}
+NAME_VARIANTS = {
+    'MUHAMMED': ['MUHAMMET', 'MOHAMMED', 'MOHAMET'],
+    'MUHAMMET': ['MUHAMMED', 'MOHAMMED', 'MOHAMET'],
+    'MOHAMMED': ['MUHAMMED', 'MUHAMMET', 'MOHAMET'],
+    'MOHAMET': ['MUHAMMED', 'MUHAMMET', 'MOHAMMED'],
+    'MEHMET': ['MEHMED','MEMET'],
+    'MEHMED': ['MEHMET','MEMET'],
+    'MEMET': ['MEHMET','MEHMED'],
+}
+
+_TURKISH_TRANSLATION = str.maketrans(TURKISH_CHAR_MAP)
+# Her varyant, NAME_VARIANTS sırasına göre ilk eşleşen anahtara gider (eski döngüyle aynı sonuç)
+_CANONICAL_NAMES = {}
+for _key, _variants in NAME_VARIANTS.items():
+    for _name in [_key] + _variants:
+        _CANONICAL_NAMES.setdefault(_name, _key)
+
+
+@dataclass
+class Client:
+    first_name: str
+    last_name: str
+    lead_attorney: str
+    originating_attorney: str
+    a_number: str = ''
+
+
+@dataclass
+class ClientRoster:
+    """Client listesi ve eşleştirme için bir kere hesaplanan indeksler."""
+    clients: List[Client] = field(default_factory=list)
+    # normalize edilmiş "AD SOYAD" -> listedeki ilk client
+    by_full_name: Dict[str, Client] = field(default_factory=dict)
+    # normalize edilmiş soyad -> o soyada sahip bütün client'lar (CSV sırasıyla)
+    by_surname: Dict[str, List[Client]] = field(default_factory=dict)
+    # 9 haneli A numarası -> listedeki ilk client
+    by_a_number: Dict[str, Client] = field(default_factory=dict)
+
+    def find_by_full_name(self, normalized_full_name):
+        return self.by_full_name.get(normalized_full_name)
+
+    def find_by_surname(self, normalized_surname):
+        return self.by_surname.get(normalized_surname, [])
+
+    def find_by_a_number(self, a_number):
+        a_number = normalize_a_number(a_number)
+        return self.by_a_number.get(a_number) if a_number else None
+
+
+# Client Processing Module
+def normalize_name(name):
+    if not isinstance(name, str):
+        name = str(name) if name is not None else ''
+    normalized_name = name.translate(_TURKISH_TRANSLATION)
+    normalized_name = _CANONICAL_NAMES.get(normalized_name, normalized_name)
+    return normalized_name.upper()
+
+
+def normalize_a_number(value):
+    """'123-456-789', '123456789' veya sayısal okunmuş değerleri 9 haneli stringe çevirir, geçersizse ''."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    if isinstance(value, (int, float)):
+        value = f"{int(value):09d}"
+    digits = re.sub(r'\D', '', str(value))
+    return digits if len(digits) == 9 else ''
+
+
+def client_full_name_key(client):
+    return normalize_name(f"{client.first_name} {client.last_name}".strip().upper())
+
+
+def build_client_roster(clients, full_name_keys=None, surname_keys=None):
+    if full_name_keys is None:
+        full_name_keys = [client_full_name_key(client) for client in clients]
+    if surname_keys is None:
+        surname_keys = [normalize_name(client.last_name) for client in clients]
+    roster = ClientRoster(clients=clients)
+    for client, full_name_key, surname_key in zip(clients, full_name_keys, surname_keys):
+        roster.by_full_name.setdefault(full_name_key, client)
+        roster.by_surname.setdefault(surname_key, []).append(client)
+        if client.a_number:
+            roster.by_a_number.setdefault(client.a_number, client)
+    logger.info(f"Client roster indexed: {len(clients)} clients, {len(roster.by_surname)} surnames, {len(roster.by_a_number)} A numbers")
+    return roster
+
+
+def load_client_data(FILTERED_CSV_FILE):
+    import pandas as pd  # pandas sadece CSV'den yeniden oluştururken gerekli
+    # A numarası string okunmalı, yoksa baştaki 0 kaybolur
+    df = pd.read_csv(FILTERED_CSV_FILE, dtype={'A Number': str})
+    frame = prepare_client_frame(df)
+    return build_client_roster(
+        clients_from_frame(frame),
+        frame['full_name_key'].tolist(),
+        frame['surname_key'].tolist(),
+    )
+
+
+def _text_column(df, column):
+    """Kolonu strip edilmiş stringlere çevirir, string olmayan (NaN vs.) hücreler '' olur."""
+    import pandas as pd
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    values = df[column]
+    if not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+        # Tamamen boş kolonlar float (NaN) olarak okunur
+        return pd.Series('', index=df.index, dtype=object)
+    return values.str.strip().fillna('').astype(object)
+
+
+def _a_number_column(df):
+    import pandas as pd
+    if 'A Number' not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    values = df['A Number']
+    if pd.api.types.is_numeric_dtype(values):
+        return values.map(normalize_a_number).astype(object)
+    digits = values.str.replace(r'\D', '', regex=True)
+    return digits.where(digits.str.len() == 9, '').fillna('').astype(object)
+
+
+def _canonical_name_column(values):
+    """normalize_name'in kolon versiyonu; girdi zaten büyük harfe çevrilip Türkçe karakterleri atılmış olmalı."""
+    canonical = values.where(~values.isin(_CANONICAL_NAMES.keys()), values.map(_CANONICAL_NAMES))
+    return canonical.str.upper()
+
+
+# Fetch data from csv file, database : case_name - lead_attorney,originating_attorney
+def prepare_client_frame(df):
+    """
+    process_client_data'nın satır satır yaptığı işi bütün kolon üzerinde pandas string
+    işlemleriyle yapar. Dönen DataFrame'de Client alanları ve indeks anahtarları bulunur.
+    """
+    import pandas as pd
+    case_names = df['Case/Matter Name']
+    if not (pd.api.types.is_object_dtype(case_names) or pd.api.types.is_string_dtype(case_names)):
+        case_names = pd.Series(index=df.index, dtype=object)
+    frame = pd.DataFrame({
+        'case_name': case_names,
+        'lead_attorney': _text_column(df, 'Lead Attorney'),
+        'originating_attorney': _text_column(df, 'Originating Attorney'),
+        'a_number': _a_number_column(df),
+    })
+    frame = frame[frame['case_name'].notna()]
+
+    # "Ad Soyad - Dava tipi" -> "Ad Soyad", "ve Ailesi/eşi" ekini at, boşlukları tekle
+    client_name = frame['case_name'].str.split('-', n=1).str[0].str.strip()
+    client_name = client_name.str.replace(r'\s+ve\s+(Ailesi|eşi)', '', regex=True, flags=re.IGNORECASE)
+    client_name = client_name.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+    # Boş isimli satırlar (ör. "- Defensive") eşleştirilemez, atla
+    has_name = client_name.str.len() > 0
+    skipped = int((~has_name).sum())
+    if skipped:
+        logger.warning(f"{skipped} case(s) skipped because the client name is empty")
+    frame = frame[has_name]
+    client_name = client_name[has_name].str.upper()
+
+    # Son kelime soyad, geri kalanı ad; tek kelimelik isimlerde soyad boş
+    parts = client_name.str.rpartition(' ')
+    single = parts[1] == ''
+    frame = frame.assign(
+        first_name=parts[0].where(~single, parts[2]),
+        last_name=parts[2].where(~single, ''),
+    )
+
+    # Türkçe karakter dönüşümü boşluklara dokunmadığından tam isimden bir kere yapılıp soyad ondan ayrılır
+    translated = client_name.str.translate(_TURKISH_TRANSLATION)
+    translated_surname = translated.str.rpartition(' ')[2].where(~single, '')
+    frame['full_name_key'] = _canonical_name_column(translated)
+    frame['surname_key'] = _canonical_name_column(translated_surname)
+    return frame
+
+
+def clients_from_frame(frame):
+    return [
+        Client(first_name, last_name, lead_attorney, originating_attorney, a_number)
+        for first_name, last_name, lead_attorney, originating_attorney, a_number in zip(
+            frame['first_name'], frame['last_name'], frame['lead_attorney'],
+            frame['originating_attorney'], frame['a_number'],
+        )
+    ]
+
+
+def process_client_data(df):
+    return clients_from_frame(prepare_client_frame(df))
+
+
+# Roster snapshot: CSV + pandas yerine pickle'lanmış, önceden hesaplanmış roster
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _roster_to_snapshot(roster, source):
+    attorneys = {}
+    rows = []
+    positions = {}
+    for position, client in enumerate(roster.clients):
+        positions[id(client)] = position
+        rows.append((
+            client.first_name,
+            client.last_name,
+            attorneys.setdefault(client.lead_attorney, len(attorneys)),
+            attorneys.setdefault(client.originating_attorney, len(attorneys)),
+            client.a_number,
+        ))
+    return {
+        'version': SNAPSHOT_VERSION,
+        'source': source,
+        'attorneys': list(attorneys),
+        'rows': rows,
+        'by_full_name': {key: positions[id(client)] for key, client in roster.by_full_name.items()},
+        'by_surname': {key: [positions[id(client)] for client in matches] for key, matches in roster.by_surname.items()},
+        'by_a_number': {key: positions[id(client)] for key, client in roster.by_a_number.items()},
+    }
+
+
+def _roster_from_snapshot(snapshot):
+    attorneys = snapshot['attorneys']
+    clients = [
+        Client(first_name, last_name, attorneys[lead], attorneys[originating], a_number)
+        for first_name, last_name, lead, originating, a_number in snapshot['rows']
+    ]
+    return ClientRoster(
+        clients=clients,
+        by_full_name={key: clients[i] for key, i in snapshot['by_full_name'].items()},
+        by_surname={key: [clients[i] for i in matches] for key, matches in snapshot['by_surname'].items()},
+        by_a_number={key: clients[i] for key, i in snapshot['by_a_number'].items()},
+    )
+
+
+def _read_snapshot(snapshot_path):
+    try:
+        with open(snapshot_path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Roster snapshot {snapshot_path} could not be read, rebuilding: {e}")
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+
+def _write_snapshot(snapshot_path, snapshot):
+    tmp_path = f"{snapshot_path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError as e:
+        logger.warning(f"Roster snapshot {snapshot_path} could not be written: {e}")
+
+
+def load_roster(csv_path, snapshot_path=None):
+    """
+    Roster'ı snapshot'tan yükler. CSV'nin mtime/boyutu değişmişse hash'e bakılır; içerik
+    de değişmişse roster CSV'den yeniden oluşturulup snapshot güncellenir.
+    """
+    snapshot_path = snapshot_path or f"{csv_path}{SNAPSHOT_SUFFIX}"
+    stat = os.stat(csv_path)
+    snapshot = _read_snapshot(snapshot_path)
+
+    if snapshot:
+        source = snapshot['source']
+        if source['mtime_ns'] == stat.st_mtime_ns and source['size'] == stat.st_size:
+            logger.info(f"Client roster loaded from snapshot {snapshot_path}")
+            return _roster_from_snapshot(snapshot)
+        sha256 = _file_sha256(csv_path)
+        if source['sha256'] == sha256:
+            # Dosyaya dokunulmuş ama içerik aynı, sadece mtime'ı güncelle
+            snapshot['source'] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': sha256}
+            _write_snapshot(snapshot_path, snapshot)
+            logger.info(f"Client roster loaded from snapshot {snapshot_path} (CSV touched, content unchanged)")
+            return _roster_from_snapshot(snapshot)
+    else:
+        sha256 = _file_sha256(csv_path)
+
+    roster = load_client_data(csv_path)
+    source = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': sha256}
+    _write_snapshot(snapshot_path, _roster_to_snapshot(roster, source))
+    logger.info(f"Client roster rebuilt from {csv_path}, snapshot written to {snapshot_path}")
+    return roster
+
+
+class RosterReloader:
+    """
+    CSV dosyasını izler; değiştiğinde roster'ı arka plan thread'inde yeniden yükler.
+    Hazır olan roster poll() ile alınır, böylece swap ana döngüde iki cycle arasında yapılır
+    ve cycle hiçbir zaman yüklemeyi beklemez.
+    """
+
+    def __init__(self, csv_path, snapshot_path=None, settle_seconds=5):
+        self.csv_path = csv_path
+        self.snapshot_path = snapshot_path
+        # Dosya bu kadar süre değişmeden kalmadıkça yazılmakta olduğu varsayılır
+        self.settle_seconds = settle_seconds
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = None
+        self._loaded_signature = self._signature()
+        self._failed_signature = None
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.csv_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def poll(self):
+        """Yeni bir roster hazırsa onu döner, yoksa None. CSV değiştiyse yüklemeyi başlatır."""
+        with self._lock:
+            if self._pending is not None:
+                roster, self._pending = self._pending, None
+                return roster
+            if self._thread is not None and self._thread.is_alive():
+                return None
+            signature = self._signature()
+            if signature is None or signature in (self._loaded_signature, self._failed_signature):
+                return None
+            self._thread = threading.Thread(target=self._reload, args=(signature,), name='roster-reload', daemon=True)
+            self._thread.start()
+        return None
+
+    def _reload(self, signature):
+        time.sleep(self.settle_seconds)
+        if self._signature() != signature:
+            # Hâlâ yazılıyor, bir sonraki poll yeni imzayla tekrar dener
+            return
+        try:
+            roster = load_roster(self.csv_path, self.snapshot_path)
+        except Exception:
+            logger.exception(f"Client roster reload from {self.csv_path} failed, keeping the current roster")
+            with self._lock:
+                self._failed_signature = signature
+            return
+        if self._signature() != signature:
+            logger.warning(f"{self.csv_path} changed while it was being loaded, reload discarded")
+            return
+        if not roster.clients:
+            # Sadece başlık satırı yazılmış yarım bir export olabilir
+            logger.error(f"{self.csv_path} produced an empty roster, keeping the current roster")
+            with self._lock:
+                self._failed_signature = signature
+            return
+        with self._lock:
+            self._pending = roster
+            self._loaded_signature = signature
+        logger.info(f"Client roster reloaded from {self.csv_path}: {len(roster.clients)} clients")
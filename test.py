@@ -1,8 +1,10 @@
 
 import json
-import requests
-from time import sleep
-from requests.exceptions import RequestException
+import os
+from functools import lru_cache
+
+import missive_client
+from user_directory import UserDirectory
 
 # Credentials file
 SERVICE_ACCOUNT_FILE = 'credentials.json'
@@ -21,55 +23,64 @@ def load_api_key(file_path):
     except json.JSONDecodeError:
         raise ValueError(f"Invalid JSON format in: {file_path}")
 
-MISSIVE_API_KEY = load_api_key(SERVICE_ACCOUNT_FILE)
+# Credentials ve istemci ilk kullanımda oluşturulur; bu modülü import etmek dosya okumaz, ağ isteği atmaz
+@lru_cache(maxsize=None)
+def get_api_key():
+    return load_api_key(SERVICE_ACCOUNT_FILE)
+
+
+def get_webhook_secret():
+    """Missive webhook rule'unun secret'ı: önce MISSIVE_WEBHOOK_SECRET ortam değişkeni, sonra credentials.json."""
+    secret = os.environ.get("MISSIVE_WEBHOOK_SECRET")
+    if secret:
+        return secret
+    try:
+        with open(SERVICE_ACCOUNT_FILE, 'r') as file:
+            secret = json.load(file).get("MISSIVE_WEBHOOK_SECRET")
+    except (FileNotFoundError, json.JSONDecodeError):
+        secret = None
+    if not secret:
+        raise ValueError("MISSIVE_WEBHOOK_SECRET not found in the environment or credentials.json")
+    return secret
+
+
+@lru_cache(maxsize=None)
+def get_missive_client():
+    return missive_client.MissiveClient(get_api_key())
 
 
+# Missive kullanıcıları ilk kullanımda çekilir, diske cache'lenir ve TTL dolunca arka planda yenilenir
+@lru_cache(maxsize=None)
+def get_user_directory():
+    return UserDirectory(get_missive_client())
+
 
 # Function to fetch Missive users
 def get_missive_users():
-    url = 'https://public.missiveapp.com/v1/users'
-    headers = {
-        'Authorization': f'Bearer {MISSIVE_API_KEY}'
-    }
-    users = []
-    limit = 200  # Max value allowed by Missive API
-    offset = 0   # Start offset
-
-    while True:
-        try:
-            params = {
-                'limit': limit,
-                'offset': offset
-            }
-            response = requests.get(url, headers=headers, params=params, timeout=10)
-            print(f"Fetching users with offset {offset}, limit {limit}. Status Code: {response.status_code}")
-            response.raise_for_status() 
-
-            page_users = response.json().get('users', [])
-            if not page_users:
-                print("No more users found.")
-                break
-            
-            users.extend(page_users)
-            print(f"Fetched {len(page_users)} users. Total users so far: {len(users)}")
-            
-            offset += limit
-            sleep(0.5)  # Optional delay to avoid rate limiting
-
-        except RequestException as e:
-            print(f"An error occurred: {e}")
-            break
-
-    return users
-
-# Fetch and print Missive users
-users = get_missive_users()
-missive_user_set = {user['name'].strip() for user in users}
-
-#  Print the names
-print("Missive Users:")
-for name in missive_user_set:
-    print(name)
+    return get_user_directory().users()
+
+
+def __getattr__(name):
+    # Eski `test.MISSIVE_API_KEY`, `test.users` vb. kullanımlar için
+    if name == 'MISSIVE_API_KEY':
+        return get_api_key()
+    if name == 'missive':
+        return get_missive_client()
+    if name == 'user_directory':
+        return get_user_directory()
+    if name == 'users':
+        return get_missive_users()
+    if name == 'missive_user_set':
+        return {user['name'].strip() for user in get_missive_users()}
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == '__main__':
+    #  Print the names
+    print("Missive Users:")
+    for name in {user['name'].strip() for user in get_missive_users()}:
+        print(name)
+
 """
 for a_number, paralegal_name in data_dict.items():
     normalized_name = extract_main_name(paralegal_name)
@@ -0,0 +1,183 @@
+import difflib
+import threading
+import time
+import logging
+
+from checkpoint import read_json_state, write_json_state
+from roster import TURKISH_CHAR_MAP
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_FILE = 'missive_users.json'
+USER_PAGE_LIMIT = 200  # Missive API'nin izin verdiği en büyük sayfa
+USER_CACHE_TTL = 60 * 60  # saniye; bu süreden eski liste arka planda yenilenir
+FAILED_FETCH_RETRY = 60  # hiç liste yokken çekme başarısız olursa bu kadar saniye sonra tekrar dene
+
+_TURKISH_TRANSLATION = str.maketrans(TURKISH_CHAR_MAP)
+
+
+def normalize_user_name(name):
+    if not isinstance(name, str):
+        name = str(name)
+    return name.translate(_TURKISH_TRANSLATION).lower()
+
+
+class UserResolver:
+    """
+    Paralegal adını Missive kullanıcısına çevirir. Kullanıcı isimleri bir kere normalize edilip
+    indekslenir: birebir eşleşme dict'ten gelir, difflib sadece bilinmeyen yazımlar için ve
+    her isim için bir kere çalışır. Sonuç find_closest_missive_user_name ile aynıdır.
+    Kullanıcı listesi yenilenince yeni bir resolver oluşturulur.
+    """
+
+    def __init__(self, users, cutoff_ratio=0.8):
+        self.users = list(users)
+        self.cutoff_ratio = cutoff_ratio
+        self._normalized_names = [normalize_user_name(user['name']) for user in self.users]
+        # Aynı normalize isme sahip birden fazla kullanıcı varsa listedeki ilki (eski döngüyle aynı)
+        self._by_name = {}
+        for user, normalized_name in zip(self.users, self._normalized_names):
+            self._by_name.setdefault(normalized_name, user)
+        # normalize edilmiş aranan isim -> kullanıcı ya da None; paralegal sayısı az olduğu için sınırsız
+        self._fuzzy_matches = {}
+
+    def resolve(self, name):
+        if not name:
+            return None
+        target = normalize_user_name(name)
+        user = self._by_name.get(target)
+        if user is not None:
+            return user
+        if target in self._fuzzy_matches:
+            return self._fuzzy_matches[target]
+
+        matches = difflib.get_close_matches(target, self._normalized_names, n=1, cutoff=self.cutoff_ratio)
+        user = self._by_name[matches[0]] if matches else None
+        if user is not None:
+            logger.debug(f"'{name}' resolved to Missive user '{user['name']}' by fuzzy match")
+        self._fuzzy_matches[target] = user
+        return user
+
+
+def fetch_missive_users(client, organization=None):
+    """Bütün Missive kullanıcılarını offset ile sayfa sayfa çeker."""
+    users = []
+    offset = 0
+    while True:
+        params = {'limit': USER_PAGE_LIMIT, 'offset': offset}
+        if organization:
+            params['organization'] = organization
+        response = client.get('/users', params=params, timeout=10)
+        if response.status_code == 404 and organization and offset == 0:
+            # eski API path'i
+            response = client.get(f'/organizations/{organization}/users', timeout=10)
+            response.raise_for_status()
+            return response.json().get('users', [])
+        response.raise_for_status()
+        page_users = response.json().get('users', [])
+        users.extend(page_users)
+        if len(page_users) < USER_PAGE_LIMIT:
+            return users
+        offset += USER_PAGE_LIMIT
+
+
+class UserDirectory:
+    """
+    Missive kullanıcı listesinin paylaşılan cache'i. Liste ilk kullanımda çekilir (varsa önce
+    diskteki kopya kullanılır), diske yazılır ve `ttl_seconds` dolunca arka planda yenilenir;
+    yenileme sırasında eski liste kullanılmaya devam eder. Hem assignment için UserResolver'ı
+    hem de archive için aktif kullanıcı ID'lerini verir.
+    """
+
+    def __init__(self, client, cache_path=USER_CACHE_FILE, ttl_seconds=USER_CACHE_TTL,
+                 organization=None, cutoff_ratio=0.8):
+        self.client = client
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.organization = organization
+        self.cutoff_ratio = cutoff_ratio
+        self._users = None
+        self._resolver = None
+        self._fetched_at = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._loaded_from_disk = False
+
+    def _set_users(self, users, fetched_at):
+        resolver = UserResolver(users, cutoff_ratio=self.cutoff_ratio)
+        with self._lock:
+            self._users = users
+            self._resolver = resolver
+            self._fetched_at = fetched_at
+
+    @property
+    def _cache_key(self):
+        # Aynı dosyada her organization filtresi için ayrı liste (archive organization'a göre çeker)
+        return self.organization or ''
+
+    def _load_from_disk(self):
+        self._loaded_from_disk = True
+        data = read_json_state(self.cache_path) if self.cache_path else None
+        entry = data.get(self._cache_key) if isinstance(data, dict) else None
+        if not isinstance(entry, dict):
+            return
+        users = entry.get('users')
+        if isinstance(users, list) and users:
+            self._set_users(users, float(entry.get('fetched_at', 0)))
+            logger.info(f"Loaded {len(users)} Missive users from {self.cache_path}")
+
+    def refresh(self):
+        """Listeyi hemen çeker ve diske yazar; başarısız olursa eski liste korunur."""
+        fetched_at = time.time()
+        try:
+            users = fetch_missive_users(self.client, self.organization)
+        except Exception as e:
+            logger.error(f"Missive users could not be fetched: {e}")
+            self._retry_at = time.monotonic() + FAILED_FETCH_RETRY
+            return False
+        if not users:
+            logger.warning("Missive returned no users, keeping the previous user list")
+            self._retry_at = time.monotonic() + FAILED_FETCH_RETRY
+            return False
+        self._set_users(users, fetched_at)
+        logger.info(f"Fetched {len(users)} Missive users")
+        if self.cache_path:
+            data = read_json_state(self.cache_path)
+            data = data if isinstance(data, dict) else {}
+            data[self._cache_key] = {'fetched_at': fetched_at, 'users': users}
+            try:
+                write_json_state(self.cache_path, data)
+            except OSError as e:
+                logger.error(f"User cache {self.cache_path} could not be written: {e}")
+        return True
+
+    def _background_refresh(self):
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self.refresh, name='missive-user-refresh', daemon=True)
+            self._refresh_thread.start()
+
+    def _current(self):
+        if not self._loaded_from_disk:
+            self._load_from_disk()
+        if time.monotonic() >= self._retry_at:
+            if self._users is None:
+                # Hiç liste yok, ilk kullanımda beklemek zorundayız
+                self.refresh()
+            elif time.time() - self._fetched_at >= self.ttl_seconds:
+                self._background_refresh()
+        with self._lock:
+            return self._users or [], self._resolver
+
+    def users(self):
+        return self._current()[0]
+
+    def resolve(self, name):
+        resolver = self._current()[1]
+        return resolver.resolve(name) if resolver else None
+
+    def active_user_ids(self):
+        """Hesabı kapatılmamış (deactivated olmayan) kullanıcıların ID'leri."""
+        return {u['id'] for u in self.users() if not u.get('is_deactivated', False)}
@@ -0,0 +1,189 @@
+"""
+Missive webhook alıcısı.
+
+Missive'de team inbox'a yeni mesaj geldiğinde bu sunucuya POST atan bir rule (webhook) tanımlanır.
+Her istek rule'un secret'ı ile HMAC-SHA256 imzalanır (`X-Hook-Signature: sha256=<hex>`);
+imzası tutmayan istekler reddedilir, geçerli olanlar kuyruğa konur ve main4 döngüsü tarafından
+assignment pipeline'ına verilir.
+
+Lokal test için sahte webhook gönderici:
+
+    python webhook.py --url http://127.0.0.1:8080/missive/webhook --secret s3cret --conversation <id>
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Hook-Signature'
+WEBHOOK_PATH = '/missive/webhook'
+MAX_BODY_BYTES = 1_000_000
+
+
+def sign_payload(secret, body):
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def verify_signature(secret, body, signature):
+    if not signature:
+        return False
+    return hmac.compare_digest(sign_payload(secret, body), signature.strip())
+
+
+@dataclass
+class WebhookEvent:
+    conversation_id: str
+    last_activity_at: Optional[float] = None
+    assignees: List[str] = field(default_factory=list)
+    received_at: float = field(default_factory=time.time)
+
+
+def parse_event(payload):
+    """Missive webhook payload'undan konuşma bilgisi; konuşma yoksa None."""
+    conversation = payload.get('conversation') if isinstance(payload, dict) else None
+    if not isinstance(conversation, dict) or not conversation.get('id'):
+        return None
+    assignees = [a['id'] if isinstance(a, dict) else a for a in conversation.get('assignees') or []]
+    return WebhookEvent(
+        conversation_id=conversation['id'],
+        last_activity_at=conversation.get('last_activity_at'),
+        assignees=assignees,
+    )
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server_version = 'MissiveWebhook/1.0'
+
+    def do_POST(self):
+        receiver = self.server.receiver
+        if self.path.split('?', 1)[0] != receiver.path:
+            self._respond(404)
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            self._respond(413)
+            return
+        body = self.rfile.read(length)
+        if not verify_signature(receiver.secret, body, self.headers.get(SIGNATURE_HEADER)):
+            logger.warning(f"Rejected webhook with invalid signature from {self.client_address[0]}")
+            self._respond(401)
+            return
+        try:
+            event = parse_event(json.loads(body))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            self._respond(400)
+            return
+        if event is not None:
+            receiver.events.put(event)
+        self._respond(202)
+
+    def _respond(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class WebhookReceiver:
+    """Arka plan thread'inde çalışan HTTP sunucusu; doğrulanmış olaylar `events` kuyruğunda birikir."""
+
+    def __init__(self, secret, host='0.0.0.0', port=8080, path=WEBHOOK_PATH):
+        if not secret:
+            raise ValueError("Webhook secret is required")
+        self.secret = secret
+        self.path = path
+        self.events = queue.Queue()
+        self._server = ThreadingHTTPServer((host, port), _WebhookHandler)
+        self._server.daemon_threads = True
+        self._server.receiver = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='missive-webhook', daemon=True)
+        self._thread.start()
+        logger.info(f"Listening for Missive webhooks on {self.url}")
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def drain(self, timeout, batch_window=2.0):
+        """
+        İlk olayı en fazla `timeout` saniye bekler, sonra `batch_window` boyunca gelenleri de toplar
+        (aynı aileye ait mailler genelde peş peşe gelir). Aynı konuşma için en son olay tutulur.
+        """
+        try:
+            first = self.events.get(timeout=max(timeout, 0))
+        except queue.Empty:
+            return []
+        events = {first.conversation_id: first}
+        deadline = time.monotonic() + batch_window
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = self.events.get(timeout=remaining)
+            except queue.Empty:
+                break
+            events[event.conversation_id] = event
+        return list(events.values())
+
+
+def send_fake_webhook(url, secret, conversation_id, last_activity_at=None, assignees=(), signature=None):
+    """Missive'in göndereceğine benzer imzalı bir webhook yollar, HTTP status kodunu döner."""
+    payload = {
+        'rule': {'id': 'fake-rule', 'type': 'webhook'},
+        'conversation': {
+            'id': conversation_id,
+            'last_activity_at': last_activity_at or int(datetime.now(timezone.utc).timestamp()),
+            'assignees': [{'id': a} for a in assignees],
+        },
+    }
+    body = json.dumps(payload).encode('utf-8')
+    request = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        SIGNATURE_HEADER: signature or sign_payload(secret, body),
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main():
+    p = argparse.ArgumentParser(description="Send a fake, signed Missive webhook to a local receiver")
+    p.add_argument("--url", default=f"http://127.0.0.1:8080{WEBHOOK_PATH}", help="Receiver URL (default %(default)s)")
+    p.add_argument("--secret", required=True, help="Webhook secret shared with the receiver")
+    p.add_argument("--conversation", required=True, help="Conversation ID to put in the payload")
+    args = p.parse_args()
+    status = send_fake_webhook(args.url, args.secret, args.conversation)
+    print(f"Receiver answered {status}")
+
+
+if __name__ == "__main__":
+    main()